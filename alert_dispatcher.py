@@ -0,0 +1,270 @@
+import json
+import os
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from email.message import EmailMessage
+from instrumentation import metrics
+
+DEFAULT_ALERT_CONFIG = {
+    "transport": "auto",
+    "smtp_host": "smtp.gmail.com",
+    "smtp_port": 465,
+    "smtp_ssl": True,
+    "smtp_user": None,
+    "smtp_password": None,
+    "sender": None,
+    "receiver": None,
+    "recipient_name": "Mr. Igbaria Ahmad",
+    "file_sink_dir": os.path.join("DetectedPerson", "outbox"),
+    "rate_limit_window": 60.0,
+    "max_alerts_per_window": 1,
+    "max_retries": 3,
+    "retry_backoff": 1.0,
+}
+
+
+def load_alert_config(path=None):
+    config = dict(DEFAULT_ALERT_CONFIG)
+
+    if path is not None and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+
+    # ALERT_SMTP_PASSWORD etc. override the file so secrets can stay out of it.
+    for key, default in DEFAULT_ALERT_CONFIG.items():
+        value = os.environ.get(f"ALERT_{key.upper()}")
+        if value is None:
+            continue
+        if isinstance(default, bool):
+            value = value.lower() in ("1", "true", "yes")
+        elif isinstance(default, int):
+            value = int(value)
+        elif isinstance(default, float):
+            value = float(value)
+        config[key] = value
+
+    return config
+
+
+class Alert:
+    def __init__(self, jpeg_bytes, timestamp=None, camera=None, details=None):
+        self.jpeg_bytes = jpeg_bytes
+        self.timestamp = timestamp or datetime.now()
+        self.camera = camera
+        self.details = details or {}
+        self.count = 1
+
+    def merge(self, other):
+        # The newest snapshot is the most useful one to attach.
+        self.jpeg_bytes = other.jpeg_bytes
+        self.timestamp = other.timestamp
+        self.details = other.details
+        self.count += other.count
+
+    @property
+    def filename(self):
+        camera = f"{self.camera}_" if self.camera else ""
+        return f"person_detected_{camera}{self.timestamp.strftime('%Y%m%d_%H%M%S')}.jpg"
+
+
+class SmtpTransport:
+    def __init__(self, host, port, use_ssl=True, user=None, password=None, timeout=30):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.server = None
+
+    def connect(self):
+        if self.use_ssl:
+            self.server = smtplib.SMTP_SSL(self.host, self.port, context=ssl.create_default_context(), timeout=self.timeout)
+        else:
+            self.server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.user:
+            self.server.login(self.user, self.password)
+
+    def send(self, msg):
+        # The connection is kept open between alerts and only re-established
+        # when the server has dropped it.
+        if self.server is not None:
+            try:
+                if self.server.noop()[0] != 250:
+                    self.close()
+            except smtplib.SMTPException:
+                self.close()
+
+        if self.server is None:
+            self.connect()
+
+        try:
+            self.server.send_message(msg)
+        except (smtplib.SMTPException, OSError):
+            self.close()
+            raise
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+
+class FileSinkTransport:
+    def __init__(self, directory):
+        self.directory = directory
+        self.sent = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, msg):
+        self.sent += 1
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        with open(os.path.join(self.directory, f"alert_{timestamp}_{self.sent}.eml"), "wb") as f:
+            f.write(msg.as_bytes())
+
+    def close(self):
+        pass
+
+
+class AlertDispatcher:
+    def __init__(self, transport, sender, receiver, recipient_name="", snapshot_dir=None,
+                 rate_limit_window=60.0, max_alerts_per_window=1, max_retries=3, retry_backoff=1.0):
+        self.transport = transport
+        self.sender = sender
+        self.receiver = receiver
+        self.recipient_name = recipient_name
+        self.snapshot_dir = snapshot_dir
+        self.rate_limit_window = rate_limit_window
+        self.max_alerts_per_window = max_alerts_per_window
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self.stats = {"submitted": 0, "sent": 0, "coalesced": 0, "failed": 0}
+        self.sent_times = deque()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, alert):
+        self.stats["submitted"] += 1
+        metrics.inc("alerts_total", result="submitted")
+        self.queue.put(alert)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.transport.close()
+
+    def _window_wait(self):
+        now = time.monotonic()
+        while self.sent_times and now - self.sent_times[0] >= self.rate_limit_window:
+            self.sent_times.popleft()
+        if len(self.sent_times) < self.max_alerts_per_window:
+            return 0.0
+        return self.rate_limit_window - (now - self.sent_times[0])
+
+    def _run(self):
+        # Alerts that arrive while the rate limit is exhausted are coalesced per camera.
+        pending = {}
+        while True:
+            timeout = max(self._window_wait(), 0.01) if pending else None
+            try:
+                alert = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                alert = False
+
+            if alert is None:
+                for pending_alert in pending.values():
+                    self._deliver(pending_alert)
+                break
+
+            if alert:
+                self._save_snapshot(alert)
+                if alert.camera in pending:
+                    pending[alert.camera].merge(alert)
+                    self.stats["coalesced"] += 1
+                    metrics.inc("alerts_total", result="coalesced")
+                else:
+                    pending[alert.camera] = alert
+
+            while pending and self._window_wait() <= 0:
+                camera = next(iter(pending))
+                self._deliver(pending.pop(camera))
+
+    def _save_snapshot(self, alert):
+        if self.snapshot_dir is None:
+            return
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        with open(os.path.join(self.snapshot_dir, alert.filename), "wb") as f:
+            f.write(alert.jpeg_bytes)
+
+    def build_message(self, alert):
+        now = alert.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        msg = EmailMessage()
+        msg["Subject"] = "Important Mail!! Warning, Person Detected at Home!"
+        msg["From"] = self.sender
+        msg["To"] = self.receiver
+
+        body = f"Dear {self.recipient_name},\n\nA person has been detected entering your home at {now}."
+        if alert.camera:
+            body += f"\nCamera: {alert.camera}"
+        for key, value in alert.details.items():
+            body += f"\n{key}: {value}"
+        if alert.count > 1:
+            body += f"\n{alert.count} detections were grouped into this alert."
+        msg.set_content(body + "\nPlease find the attached image.\n\nStay safe.")
+        msg.add_attachment(alert.jpeg_bytes, maintype="image", subtype="jpeg", filename=alert.filename)
+        return msg
+
+    def _deliver(self, alert):
+        msg = self.build_message(alert)
+        for attempt in range(self.max_retries + 1):
+            try:
+                with metrics.span("alert_delivery"):
+                    self.transport.send(msg)
+                self.sent_times.append(time.monotonic())
+                self.stats["sent"] += 1
+                metrics.inc("alerts_total", result="sent")
+                print("Email sent!")
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                if attempt == self.max_retries:
+                    break
+                delay = self.retry_backoff * (2 ** attempt)
+                print(f"Alert delivery failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+        self.stats["failed"] += 1
+        metrics.inc("alerts_total", result="failed")
+        print("Error: alert could not be delivered")
+
+
+def create_alert_dispatcher(config, snapshot_dir=None):
+    transport_name = config["transport"]
+    if transport_name == "auto":
+        transport_name = "smtp" if config["smtp_user"] else "file"
+        if transport_name == "file":
+            print(f"No SMTP credentials configured, alerts are written to {config['file_sink_dir']}")
+
+    if transport_name == "smtp":
+        transport = SmtpTransport(config["smtp_host"], config["smtp_port"], config["smtp_ssl"],
+                                  config["smtp_user"], config["smtp_password"])
+    elif transport_name == "file":
+        transport = FileSinkTransport(config["file_sink_dir"])
+    else:
+        raise ValueError(f"Unknown alert transport: {transport_name}")
+
+    sender = config["sender"] or config["smtp_user"] or "person-detector@localhost"
+    receiver = config["receiver"] or sender
+    return AlertDispatcher(transport, sender, receiver, config["recipient_name"], snapshot_dir,
+                           config["rate_limit_window"], config["max_alerts_per_window"],
+                           config["max_retries"], config["retry_backoff"])
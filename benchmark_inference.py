@@ -0,0 +1,96 @@
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+import cv2
+import numpy as np
+
+BACKENDS = ("ultralytics", "onnxruntime", "opencv_dnn")
+
+
+def read_frames(video_source, max_frames):
+    cap = cv2.VideoCapture(video_source)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.resize(frame, (1280, 720)))
+    cap.release()
+    return frames
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure_backend(name, video_source, max_frames, options):
+    # Runs in a fresh process so startup time and peak RSS belong to this backend alone.
+    from inference_backends import create_backend
+
+    frames = read_frames(video_source, max_frames)
+    baseline_rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    backend = create_backend(name, **options)
+    load_time = time.perf_counter() - start
+    backend.warmup()
+    startup_time = time.perf_counter() - start
+
+    latencies = []
+    detections = 0
+    for frame in frames:
+        start = time.perf_counter()
+        detections += len(backend.predict([frame])[0])
+        latencies.append(time.perf_counter() - start)
+
+    latencies = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "load_s": load_time,
+        "startup_s": startup_time,
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "fps": 1000 / float(latencies.mean()) if latencies.mean() else 0.0,
+        "detections": detections,
+        "peak_rss_mb": peak_rss_mb(),
+        "model_rss_mb": peak_rss_mb() - baseline_rss,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare person detector inference backends on recorded footage.")
+    parser.add_argument("video", help="Video file to read frames from.")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--weights", default="yolov8s.pt")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--int8", action="store_true", help="Also benchmark INT8 weights with onnxruntime.")
+    args = parser.parse_args()
+
+    runs = []
+    for name in args.backends:
+        options = {"weights": args.weights, "threads": args.threads}
+        runs.append((name, options))
+        if args.int8 and name == "onnxruntime":
+            runs.append((name, dict(options, int8=True)))
+
+    # Export (and quantize) up front so the one-off conversion is not counted as startup.
+    for name, options in runs:
+        if name != "ultralytics":
+            with multiprocessing.get_context("spawn").Pool(1) as pool:
+                pool.apply(measure_backend, (name, args.video, 0, options))
+
+    print(f"\nInference Benchmark ({args.video}, {args.frames} frames, threads={args.threads or 'default'}):")
+    print(f"{'backend':>16} {'load s':>7} {'startup s':>9} {'mean ms':>8} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'fps':>6} {'people':>7} {'peak MB':>8} {'model MB':>8}")
+    for name, options in runs:
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            result = pool.apply(measure_backend, (name, args.video, args.frames, options))
+        label = name + ("-int8" if options.get("int8") else "")
+        print(f"{label:>16} {result['load_s']:>7.2f} {result['startup_s']:>9.2f} {result['mean_ms']:>8.1f} "
+              f"{result['p50_ms']:>7.1f} {result['p95_ms']:>7.1f} {result['fps']:>6.1f} {result['detections']:>7} "
+              f"{result['peak_rss_mb']:>8.0f} {result['model_rss_mb']:>8.0f}")
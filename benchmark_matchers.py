@@ -0,0 +1,85 @@
+import argparse
+import time
+import cv2
+import numpy as np
+from feature_matchers import MATCHER_BACKENDS, create_matcher, GridOrbDetector
+
+
+def read_gray_frames(video_source, max_frames):
+    cap = cv2.VideoCapture(video_source)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    cap.release()
+    return frames
+
+
+def extract_features(frames, nfeatures, grid):
+    detector = GridOrbDetector(nfeatures=nfeatures, grid=grid) if grid else cv2.ORB_create(nfeatures=nfeatures)
+    start = time.perf_counter()
+    features = [detector.detectAndCompute(gray, None) for gray in frames]
+    return features, time.perf_counter() - start
+
+
+def inlier_ratio(kp1, kp2, matches):
+    if len(matches) < 8:
+        return None
+    pts1 = np.float32([kp1[m.queryIdx].pt for m in matches])
+    pts2 = np.float32([kp2[m.trainIdx].pt for m in matches])
+    _, mask = cv2.findFundamentalMat(pts1, pts2, cv2.FM_RANSAC, 1.0, 0.99)
+    if mask is None:
+        return None
+    return float(mask.mean())
+
+
+def benchmark_backend(name, features):
+    matcher = create_matcher(name)
+    match_time = 0.0
+    total_matches = 0
+    ratios = []
+
+    for (kp1, des1), (kp2, des2) in zip(features, features[1:]):
+        if des1 is None or des2 is None:
+            continue
+        start = time.perf_counter()
+        matches = matcher.match(des1, des2)
+        match_time += time.perf_counter() - start
+        total_matches += len(matches)
+        ratio = inlier_ratio(kp1, kp2, matches)
+        if ratio is not None:
+            ratios.append(ratio)
+
+    pairs = max(len(features) - 1, 1)
+    return {
+        "pairs_per_second": pairs / match_time if match_time else 0.0,
+        "matches_per_second": total_matches / match_time if match_time else 0.0,
+        "mean_matches": total_matches / pairs,
+        "inlier_ratio": float(np.mean(ratios)) if ratios else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare FeatureMatcher backends on recorded footage.")
+    parser.add_argument("video", help="Video file to read frames from.")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--nfeatures", type=int, nargs="+", default=[500, 1000, 2000])
+    parser.add_argument("--grid", type=int, nargs=2, default=None, metavar=("ROWS", "COLS"))
+    args = parser.parse_args()
+
+    frames = read_gray_frames(args.video, args.frames)
+    if len(frames) < 2:
+        raise SystemExit("Error: need at least two frames to benchmark matching")
+
+    grid = tuple(args.grid) if args.grid else None
+    print(f"\nMatcher Benchmark ({len(frames)} frames, grid={grid}):")
+    print(f"{'backend':>12} {'nfeatures':>9} {'extract ms':>10} {'pairs/s':>9} {'matches/s':>11} {'matches':>8} {'inliers':>8}")
+    for nfeatures in args.nfeatures:
+        features, extract_time = extract_features(frames, nfeatures, grid)
+        extract_ms = extract_time / len(frames) * 1000
+        for name in MATCHER_BACKENDS:
+            result = benchmark_backend(name, features)
+            print(f"{name:>12} {nfeatures:>9} {extract_ms:>10.2f} {result['pairs_per_second']:>9.1f} "
+                  f"{result['matches_per_second']:>11.0f} {result['mean_matches']:>8.1f} {result['inlier_ratio']:>8.2f}")
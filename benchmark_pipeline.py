@@ -0,0 +1,311 @@
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import cv2
+import numpy as np
+
+STAGES = ("calibrate", "undistort", "match", "visualize", "triangulate", "detect")
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class RssSampler:
+    # ru_maxrss is the peak of the whole process, so it never drops after the
+    # heaviest stage; the current RSS is sampled instead to get a per-stage peak.
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start_mb = current_rss_mb()
+        self.peak_mb = self.start_mb
+        self.stop_event = threading.Event()
+        self.thread = None
+        if self.start_mb is not None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def stop(self):
+        if self.thread is None:
+            # Without /proc only the process-wide peak is available.
+            return {"peak_rss_mb": peak_rss_mb(), "rss_delta_mb": None}
+        self.stop_event.set()
+        self.thread.join()
+        end_mb = current_rss_mb()
+        return {"peak_rss_mb": max(self.peak_mb, end_mb), "rss_delta_mb": end_mb - self.start_mb}
+
+
+def read_frames(video_source, max_frames):
+    cap = cv2.VideoCapture(video_source)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+class NullAlertDispatcher:
+    # Keeps the detect stage from creating alert transports or an outbox.
+    def submit(self, alert):
+        pass
+
+    def close(self):
+        pass
+
+
+def summarize(name, items, elapsed, latencies, traced, rss):
+    result = {
+        "stage": name,
+        "items": items,
+        "elapsed_s": elapsed,
+        "fps": items / elapsed if elapsed else 0.0,
+        "p50_ms": None,
+        "p95_ms": None,
+        "p99_ms": None,
+        "peak_rss_mb": rss["peak_rss_mb"],
+        "rss_delta_mb": rss["rss_delta_mb"],
+        "alloc_peak_mb": None,
+        "alloc_live_blocks": None,
+    }
+    if latencies:
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+        result.update(p50_ms=float(p50), p95_ms=float(p95), p99_ms=float(p99))
+    if traced:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        result["alloc_peak_mb"] = peak / (1024 * 1024)
+        # Tracing starts with the stage, so these are blocks allocated by the stage and still alive at its end.
+        result["alloc_live_blocks"] = sum(stat.count for stat in snapshot.statistics("filename"))
+    return result
+
+
+class PipelineBenchmark:
+    def __init__(self, video, image_path=None, checkerboard_size=(10, 7), frames=200, workdir=None,
+                 trace_allocations=True, backend_options=None):
+        self.video = video
+        self.image_path = image_path
+        self.checkerboard_size = checkerboard_size
+        self.frames = frames
+        self.workdir = workdir or tempfile.mkdtemp(prefix="pipeline_benchmark_")
+        self.match_save_path = os.path.join(self.workdir, "matched_points")
+        self.output_3d_path = os.path.join(self.workdir, "triangulated_3D")
+        self.trace_allocations = trace_allocations
+        self.backend_options = backend_options
+        self.camera_matrix = None
+        self.dist_coeffs = None
+        self.results = {}
+
+    def default_intrinsics(self):
+        # Without a calibration result, a nominal pinhole camera keeps the later stages runnable.
+        frame = read_frames(self.video, 1)[0]
+        h, w = frame.shape[:2]
+        self.camera_matrix = np.array([[w, 0, w / 2], [0, w, h / 2], [0, 0, 1]], dtype=np.float64)
+        self.dist_coeffs = np.zeros((1, 5))
+        print("No calibration result, using a nominal camera matrix")
+
+    def stage_calibrate(self):
+        from camera_calibration import CameraCalibration
+        calibration = CameraCalibration(self.checkerboard_size, self.image_path, write_annotated=False)
+        images = calibration.list_calibration_images()
+        latencies = []
+        for img_file in images:
+            start = time.perf_counter()
+            calibration.add_corners(*calibration.detect_corners(img_file))
+            latencies.append(time.perf_counter() - start)
+        calibration.calibrate_camera()
+        if calibration.camera_matrix is not None:
+            self.camera_matrix, self.dist_coeffs = calibration.camera_matrix, calibration.distortion_coeffs
+        return len(images), latencies
+
+    def stage_undistort(self):
+        from undistortion_map import get_undistortion_map
+        frames = read_frames(self.video, self.frames)
+        latencies = []
+        for frame in frames:
+            start = time.perf_counter()
+            h, w = frame.shape[:2]
+            get_undistortion_map(self.camera_matrix, self.dist_coeffs, (w, h)).apply(frame)
+            latencies.append(time.perf_counter() - start)
+        return len(frames), latencies
+
+    def stage_match(self):
+        from feature_matching import FeatureMatcher
+        matcher = FeatureMatcher(self.video, self.workdir, self.match_save_path, max_frames=self.frames,
+                                 max_duration=None, display=False)
+        matcher.match_features()
+        return len(matcher.frame_latencies), matcher.frame_latencies
+
+    def stage_visualize(self):
+        from feature_match_visualizer import render_pair_plots
+        from match_store import iter_match_pairs
+        from plot_pool import use_agg_backend
+        use_agg_backend()
+        visuals_root = os.path.join(self.workdir, "FeatureMatchPlots")
+        os.makedirs(visuals_root, exist_ok=True)
+        latencies = []
+        for index, points1, points2 in iter_match_pairs(self.match_save_path):
+            start = time.perf_counter()
+            render_pair_plots(visuals_root, np.array(points1, dtype=np.float64), np.array(points2, dtype=np.float64), index)
+            latencies.append(time.perf_counter() - start)
+        return len(latencies), latencies
+
+    def stage_triangulate(self):
+        from match_store import iter_match_pairs
+        from triangulation_3d import Triangulation3D
+        # Plots are left out so the stage measures triangulation, not matplotlib.
+        triangulation = Triangulation3D(self.camera_matrix, self.dist_coeffs, self.match_save_path, self.output_3d_path,
+                                        render_plots=False)
+        latencies = []
+        for pair in iter_match_pairs(self.match_save_path):
+            # Each pair is solved as its own batch so it gets its own latency.
+            start = time.perf_counter()
+            for chunk in triangulation.triangulate_chunks([pair]):
+                for index, pair_points, pair_deltas in chunk:
+                    triangulation.save_3d_points_with_stats(pair_points, pair_deltas, index)
+            latencies.append(time.perf_counter() - start)
+        return len(latencies), latencies
+
+    def stage_detect(self):
+        from person_detector import PersonDetector
+        frames = read_frames(self.video, self.frames)
+        # Headless, no alerts and no retention: a benchmark run leaves DetectedPerson/ alone.
+        detector = PersonDetector(self.camera_matrix, self.dist_coeffs, video_source=self.video,
+                                  alert_dispatcher=NullAlertDispatcher(), backend_options=self.backend_options,
+                                  headless=True)
+        latencies = []
+        for frame in frames:
+            start = time.perf_counter()
+            detector.detect(detector.preprocess(frame))
+            latencies.append(time.perf_counter() - start)
+        detector.sinks.close()
+        return len(frames), latencies
+
+    def run(self, stages=STAGES):
+        for name in STAGES:
+            if name not in stages:
+                continue
+            if name == "calibrate" and not self.image_path:
+                self.results[name] = {"stage": name, "skipped": "no calibration images"}
+                continue
+            if name != "calibrate" and self.camera_matrix is None:
+                self.default_intrinsics()
+
+            if self.trace_allocations:
+                tracemalloc.start()
+            sampler = RssSampler()
+            start = time.perf_counter()
+            try:
+                items, latencies = getattr(self, f"stage_{name}")()
+                elapsed = time.perf_counter() - start
+                self.results[name] = summarize(name, items, elapsed, latencies, self.trace_allocations, sampler.stop())
+            except ImportError as error:
+                sampler.stop()
+                self.results[name] = {"stage": name, "skipped": str(error)}
+            finally:
+                if self.trace_allocations:
+                    tracemalloc.stop()
+
+        return self.results
+
+    def to_json(self):
+        return {
+            "video": self.video,
+            "frames": self.frames,
+            "trace_allocations": self.trace_allocations,
+            "stages": self.results,
+        }
+
+
+def format_ms(value):
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def print_results(results):
+    print(f"\n{'stage':>12} {'items':>6} {'fps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rss MB':>7} {'Δrss MB':>8} {'alloc MB':>9}")
+    for name, stage in results.items():
+        if "skipped" in stage:
+            print(f"{name:>12} skipped ({stage['skipped']})")
+            continue
+        alloc = format_ms(stage["alloc_peak_mb"])
+        print(f"{name:>12} {stage['items']:>6} {stage['fps']:>8.1f} {format_ms(stage['p50_ms']):>8} "
+              f"{format_ms(stage['p95_ms']):>8} {format_ms(stage['p99_ms']):>8} {stage['peak_rss_mb']:>7.0f} "
+              f"{format_ms(stage['rss_delta_mb']):>8} {alloc:>9}")
+
+
+def check_regressions(results, baseline, tolerance):
+    # Throughput may not drop, and tail latency / stage memory may not grow, by more than tolerance.
+    regressions = []
+    for name, stage in results.items():
+        base = baseline.get("stages", {}).get(name)
+        if base is None or "skipped" in stage or "skipped" in base:
+            continue
+        if base["fps"] and stage["fps"] < base["fps"] * (1 - tolerance):
+            regressions.append(f"{name}: fps {stage['fps']:.1f} < baseline {base['fps']:.1f}")
+        for key in ("p95_ms", "p99_ms", "peak_rss_mb", "alloc_peak_mb"):
+            if base.get(key) and stage.get(key) is not None and stage[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {stage[key]:.1f} > baseline {base[key]:.1f}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a video through every pipeline stage and report performance.")
+    parser.add_argument("video", help="Recorded video file to replay.")
+    parser.add_argument("--images", default=None, help="Checkerboard image folder for the calibration stage.")
+    parser.add_argument("--checkerboard", type=int, nargs=2, default=(10, 7), metavar=("COLS", "ROWS"))
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--workdir", default=None, help="Folder for intermediate outputs (default: a temp folder).")
+    parser.add_argument("--backend", default="ultralytics", help="Inference backend for the detect stage.")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Skip allocation tracing (faster, no alloc stats).")
+    parser.add_argument("--json", default=None, help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", default=None, help="Compare against a previous JSON result and fail on regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.video):
+        raise SystemExit(f"Error: {args.video} is not a video file")
+
+    benchmark = PipelineBenchmark(args.video, args.images, tuple(args.checkerboard), args.frames, args.workdir,
+                                  trace_allocations=not args.no_tracemalloc, backend_options={"name": args.backend})
+    results = benchmark.run(args.stages)
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(benchmark.to_json(), f, indent=2)
+        print(f"Results written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("trace_allocations") != benchmark.trace_allocations:
+            print("Warning: baseline was recorded with different allocation tracing, timings are not comparable")
+        regressions = check_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.baseline}")
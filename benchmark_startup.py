@@ -0,0 +1,74 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+MAIN = os.path.join(PROJECT_ROOT, "main.py")
+
+# "cli" is argument parsing alone; every other entry is a real main.py subcommand.
+STAGES = ("cli", "calibrate", "undistort", "match", "visualize", "triangulate", "detect")
+FAST_STAGES = ("cli", "calibrate", "undistort", "match")
+
+
+def parse_importtime(stderr, top=3):
+    # Lines look like "import time:   self [us] | cumulative | imported package";
+    # top-level packages are the ones without leading indentation.
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            imports.append((int(cumulative) / 1000, name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def measure_stage(stage):
+    # --dry-run goes through main.main() and the stage method, which stops right
+    # after its imports, so the timing follows whatever the subcommand really loads.
+    args = ["--help"] if stage == "cli" else ["--dry-run", stage]
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", MAIN] + args, cwd=PROJECT_ROOT,
+                            capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1]}
+    return {"startup_s": elapsed, "heaviest": parse_importtime(result.stderr)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure main.py start-up time per subcommand.")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.0, help="Seconds allowed for cli/calibrate/undistort/match.")
+    parser.add_argument("--json", default=None, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"\nStartup Benchmark (median of {args.runs} runs, fresh interpreter each):")
+    print(f"{'stage':>12} {'startup s':>9}  heaviest imports")
+    for stage in args.stages:
+        runs = [measure_stage(stage) for _ in range(args.runs)]
+        if "error" in runs[0]:
+            results[stage] = runs[0]
+            print(f"{stage:>12} {'-':>9}  {runs[0]['error']}")
+            continue
+        results[stage] = {
+            "startup_s": float(np.median([run["startup_s"] for run in runs])),
+            "heaviest": runs[-1]["heaviest"],
+        }
+        heaviest = ", ".join(f"{name} {ms:.0f}ms" for ms, name in results[stage]["heaviest"])
+        print(f"{stage:>12} {results[stage]['startup_s']:>9.3f}  {heaviest}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    slow = [stage for stage in FAST_STAGES if results.get(stage, {}).get("startup_s", 0) > args.budget]
+    if slow:
+        print(f"Over the {args.budget:.1f}s start-up budget: {', '.join(slow)}")
+        sys.exit(1)
@@ -0,0 +1,67 @@
+import argparse
+import time
+import cv2
+import numpy as np
+from undistortion_map import UndistortionMap
+
+
+def time_per_frame(fn, frames):
+    start = time.perf_counter()
+    for frame in frames:
+        fn(frame)
+    return (time.perf_counter() - start) / len(frames)
+
+
+def run_benchmark(camera_matrix, dist_coeffs, frames, alpha=None):
+    h, w = frames[0].shape[:2]
+
+    if alpha is None:
+        new_camera_matrix = camera_matrix
+    else:
+        new_camera_matrix, _ = cv2.getOptimalNewCameraMatrix(camera_matrix, dist_coeffs, (w, h), alpha, (w, h))
+
+    def per_frame(frame):
+        if alpha is not None:
+            cv2.getOptimalNewCameraMatrix(camera_matrix, dist_coeffs, (w, h), alpha, (w, h))
+        return cv2.undistort(frame, camera_matrix, dist_coeffs, None, new_camera_matrix)
+
+    build_start = time.perf_counter()
+    undistortion_map = UndistortionMap(camera_matrix, dist_coeffs, (w, h), alpha)
+    build_time = time.perf_counter() - build_start
+
+    roi = (w // 4, h // 4, w // 2, h // 2)
+    results = {
+        "per_frame_undistort_ms": time_per_frame(per_frame, frames) * 1000,
+        "remap_full_ms": time_per_frame(undistortion_map.apply, frames) * 1000,
+        "remap_roi_tile_ms": time_per_frame(lambda f: undistortion_map.apply(f, roi=roi), frames) * 1000,
+        "map_build_ms": build_time * 1000,
+    }
+
+    reference = per_frame(frames[0]).astype(np.int16)
+    remapped = undistortion_map.apply(frames[0]).astype(np.int16)
+    results["max_abs_pixel_diff"] = int(np.abs(reference - remapped).max())
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare cv2.undistort per frame with precomputed remap tables.")
+    parser.add_argument("--image", help="Image to undistort; a random frame is used when omitted.")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--alpha", type=float, default=None)
+    args = parser.parse_args()
+
+    if args.image:
+        frame = cv2.resize(cv2.imread(args.image), (args.width, args.height))
+    else:
+        frame = np.random.default_rng(0).integers(0, 256, (args.height, args.width, 3), dtype=np.uint8)
+
+    focal = 0.9 * args.width
+    camera_matrix = np.array([[focal, 0, args.width / 2], [0, focal, args.height / 2], [0, 0, 1]], dtype=np.float64)
+    dist_coeffs = np.array([[-0.25, 0.08, 0.0005, -0.0003, -0.01]], dtype=np.float64)
+
+    results = run_benchmark(camera_matrix, dist_coeffs, [frame] * args.frames, args.alpha)
+    print(f"\nUndistortion Benchmark ({args.width}x{args.height}, {args.frames} frames):")
+    for name, value in results.items():
+        print(f"{name}: {value:.3f}" if isinstance(value, float) else f"{name}: {value}")
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+
+class CalibrationStore:
+    def __init__(self, store_path):
+        self.store_path = store_path
+        self.data = {"checkerboard_size": None, "images": {}, "result": None}
+
+        if os.path.exists(store_path):
+            try:
+                with open(store_path, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError):
+                print(f"Warning: ignoring unreadable calibration store {store_path}")
+
+    def file_digest(self, img_file):
+        name = os.path.basename(img_file)
+        stat = os.stat(img_file)
+        entry = self.data["images"].get(name)
+
+        # Size and mtime are trusted first so unchanged images are never re-read.
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha1"]
+
+        with open(img_file, "rb") as f:
+            sha1 = hashlib.sha1(f.read()).hexdigest()
+
+        if entry is None or entry["sha1"] != sha1:
+            entry = {"sha1": sha1, "detected": False, "corners": None, "image_size": None}
+        entry["size"] = stat.st_size
+        entry["mtime_ns"] = stat.st_mtime_ns
+        self.data["images"][name] = entry
+        return sha1
+
+    def dataset_key(self, image_files, checkerboard_size):
+        checkerboard_size = list(checkerboard_size)
+        if self.data["checkerboard_size"] != checkerboard_size:
+            self.data = {"checkerboard_size": checkerboard_size, "images": {}, "result": None}
+
+        digest = hashlib.sha256(repr(tuple(checkerboard_size)).encode())
+        for img_file in image_files:
+            digest.update(os.path.basename(img_file).encode())
+            digest.update(self.file_digest(img_file).encode())
+        return digest.hexdigest()
+
+    def needs_detection(self, img_file):
+        return not self.data["images"][os.path.basename(img_file)]["detected"]
+
+    def get_corners(self, img_file):
+        entry = self.data["images"][os.path.basename(img_file)]
+        if entry["corners"] is None:
+            return None, tuple(entry["image_size"]) if entry["image_size"] else None
+        return np.array(entry["corners"], dtype=np.float32), tuple(entry["image_size"])
+
+    def set_corners(self, img_file, corners, image_size):
+        entry = self.data["images"][os.path.basename(img_file)]
+        entry["detected"] = True
+        entry["corners"] = None if corners is None else corners.tolist()
+        entry["image_size"] = list(image_size) if image_size else None
+
+    def load_result(self, key):
+        result = self.data["result"]
+        if result is None or result["key"] != key:
+            return None
+        return {
+            "camera_matrix": np.array(result["camera_matrix"], dtype=np.float64),
+            "distortion_coeffs": np.array(result["distortion_coeffs"], dtype=np.float64),
+            "mse": result["mse"],
+            "image_size": tuple(result["image_size"]),
+        }
+
+    def set_result(self, key, camera_matrix, distortion_coeffs, mse, image_size):
+        self.data["result"] = {
+            "key": key,
+            "camera_matrix": camera_matrix.tolist(),
+            "distortion_coeffs": distortion_coeffs.tolist(),
+            "mse": float(mse),
+            "image_size": list(image_size),
+        }
+
+    def save(self, image_files):
+        names = {os.path.basename(img_file) for img_file in image_files}
+        self.data["images"] = {name: entry for name, entry in self.data["images"].items() if name in names}
+
+        tmp_path = self.store_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.store_path)
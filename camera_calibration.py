@@ -2,52 +2,157 @@ import cv2
 import numpy as np
 import glob
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from instrumentation import metrics
+
+GENERATED_IMAGE_PREFIXES = ("calibrated_", "undistorted_")
+
+
+def find_chessboard_corners(img_file, checkerboard_size, criteria, detect_width=None):
+    gray = cv2.imread(img_file, cv2.IMREAD_GRAYSCALE)
+    image_size = gray.shape[::-1]
+
+    ret = False
+    if detect_width and gray.shape[1] > detect_width:
+        # Coarse search on a downscaled copy, then refine at full resolution.
+        scale = detect_width / gray.shape[1]
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ret, corners = cv2.findChessboardCorners(small, checkerboard_size, None)
+        if ret:
+            corners = corners / scale
+
+    if not ret:
+        ret, corners = cv2.findChessboardCorners(gray, checkerboard_size, None)
+        if not ret:
+            return None, image_size
+
+    corners2 = cv2.cornerSubPix(gray, corners.astype(np.float32), (11, 11), (-1, -1), criteria)
+    return corners2, image_size
+
+
+def write_annotated_image(img_file, output_file, checkerboard_size, corners):
+    img = cv2.imread(img_file)
+    cv2.drawChessboardCorners(img, checkerboard_size, corners, True)
+    cv2.imwrite(output_file, img)
+
 
 class CameraCalibration:
-    def __init__(self, checkerboard_size, image_path):
+    def __init__(self, checkerboard_size, image_path, workers=None, detect_width=None, write_annotated=True):
         self.checkerboard_size = checkerboard_size
         self.image_path = image_path
+        self.workers = workers
+        self.detect_width = detect_width
+        self.write_annotated = write_annotated
+        self.annotation_writer = None
+        self.pending_writes = []
         self.criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
         self.objp = np.zeros((checkerboard_size[0] * checkerboard_size[1], 3), np.float32)
         self.objp[:, :2] = np.mgrid[0:checkerboard_size[0], 0:checkerboard_size[1]].T.reshape(-1, 2)
         self.objpoints = []
         self.imgpoints = []
+        self.image_size = None
         self.camera_matrix = None
         self.distortion_coeffs = None
         self.mse = None
 
-    def collect_calibration_images(self):
-        images = glob.glob(os.path.join(self.image_path, '*.jpg'))
+    def list_calibration_images(self):
+        # Annotated and undistorted copies are written into the same folder,
+        # so they are skipped to keep the calibration set stable between runs.
+        images = sorted(glob.glob(os.path.join(self.image_path, '*.jpg')))
+        return [img_file for img_file in images if not os.path.basename(img_file).startswith(GENERATED_IMAGE_PREFIXES)]
 
-        for img_file in images:
-            img = cv2.imread(img_file)
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    def detect_corners(self, img_file):
+        return self.detect_all_corners([img_file])[0]
 
-            ret, corners = cv2.findChessboardCorners(gray, self.checkerboard_size, None)
+    def detect_all_corners(self, image_files):
+        find_corners = partial(find_chessboard_corners, checkerboard_size=self.checkerboard_size,
+                               criteria=self.criteria, detect_width=self.detect_width)
 
-            if ret:
-                corners2 = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), self.criteria)
-                self.objpoints.append(self.objp)
-                self.imgpoints.append(corners2)
+        with metrics.span("calibration_detect_corners"):
+            if self.workers and self.workers > 1 and len(image_files) > 1:
+                # executor.map keeps input order, so results match the sequential run.
+                with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                    results = list(executor.map(find_corners, image_files))
+            else:
+                results = [find_corners(img_file) for img_file in image_files]
+
+        for img_file, (corners, image_size) in zip(image_files, results):
+            if corners is None:
+                metrics.inc("calibration_images_total", result="failed")
+                print(f"{os.path.basename(img_file)} failed")
+                continue
+            metrics.inc("calibration_images_total", result="detected")
 
-                cv2.drawChessboardCorners(img, self.checkerboard_size, corners2, ret)
+            if self.write_annotated:
+                if self.annotation_writer is None:
+                    self.annotation_writer = ThreadPoolExecutor(max_workers=1)
                 output_file = os.path.join(self.image_path, f"calibrated_{os.path.basename(img_file)}")
-                cv2.imwrite(output_file, img)
+                self.pending_writes.append(self.annotation_writer.submit(
+                    write_annotated_image, img_file, output_file, self.checkerboard_size, corners))
 
-                print(f"{os.path.basename(img_file)} successful")
-            else:
-                print(f"{os.path.basename(img_file)} failed")
+            print(f"{os.path.basename(img_file)} successful")
+
+        return results
+
+    def wait_for_annotated_images(self):
+        for future in self.pending_writes:
+            future.result()
+        self.pending_writes = []
+
+    def add_corners(self, corners, image_size):
+        if self.image_size is None:
+            self.image_size = image_size
+        if corners is not None:
+            self.objpoints.append(self.objp)
+            self.imgpoints.append(corners)
+
+    def collect_calibration_images(self):
+        for corners, image_size in self.detect_all_corners(self.list_calibration_images()):
+            self.add_corners(corners, image_size)
+        self.wait_for_annotated_images()
+
+    def calibrate_with_store(self, store):
+        images = self.list_calibration_images()
+        key = store.dataset_key(images, self.checkerboard_size)
+
+        result = store.load_result(key)
+        if result is not None:
+            self.camera_matrix = result["camera_matrix"]
+            self.distortion_coeffs = result["distortion_coeffs"]
+            self.mse = result["mse"]
+            self.image_size = result["image_size"]
+            for img_file in images:
+                self.add_corners(*store.get_corners(img_file))
+            print(f"Calibration loaded from store ({len(images)} images unchanged)")
+            return
+
+        pending = [img_file for img_file in images if store.needs_detection(img_file)]
+        for img_file, (corners, image_size) in zip(pending, self.detect_all_corners(pending)):
+            store.set_corners(img_file, corners, image_size)
+        print(f"Corner detection ran on {len(pending)} new or changed images, {len(images) - len(pending)} reused")
+
+        for img_file in images:
+            self.add_corners(*store.get_corners(img_file))
+
+        self.calibrate_camera()
+        self.wait_for_annotated_images()
+        if self.camera_matrix is not None:
+            store.set_result(key, self.camera_matrix, self.distortion_coeffs, self.mse, self.image_size)
+        store.save(images)
 
     def calibrate_camera(self):
         if len(self.objpoints) == 0 or len(self.imgpoints) == 0:
             print("Error: No calibration data collected!")
             return
 
-        img = cv2.imread(glob.glob(os.path.join(self.image_path, '*.jpg'))[0])
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        if self.image_size is None:
+            img = cv2.imread(self.list_calibration_images()[0])
+            self.image_size = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY).shape[::-1]
 
-        ret, self.camera_matrix, self.distortion_coeffs, rvecs, tvecs = cv2.calibrateCamera(
-            self.objpoints, self.imgpoints, gray.shape[::-1], None, None)
+        with metrics.span("calibration_solve"):
+            ret, self.camera_matrix, self.distortion_coeffs, rvecs, tvecs = cv2.calibrateCamera(
+                self.objpoints, self.imgpoints, self.image_size, None, None)
 
         self.compute_mse(rvecs, tvecs)
 
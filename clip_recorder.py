@@ -0,0 +1,217 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import cv2
+import numpy as np
+from frame_sinks import FrameSink
+from instrumentation import metrics
+
+DEFAULT_RETENTION = {"max_bytes": 2 * 1024 ** 3, "max_age_days": 30, "interval": 300.0}
+RETAINED_EXTENSIONS = (".jpg", ".mp4", ".avi", ".eml")
+
+
+class FrameRingBuffer:
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_seconds=20.0, scale=0.5, encoding="jpeg", quality=80):
+        if encoding not in ("jpeg", "raw"):
+            raise ValueError(f"Unknown ring buffer encoding: {encoding}")
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.scale = scale
+        self.encoding = encoding
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        self.frames = deque()
+        self.total_bytes = 0
+        self.evicted = 0
+
+    def append(self, source, timestamp, frame):
+        if self.scale and self.scale != 1.0:
+            frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        if self.encoding == "jpeg":
+            ok, data = cv2.imencode(".jpg", frame, self.params)
+            if not ok:
+                return None
+        else:
+            data = frame
+        self.frames.append((source, timestamp, data))
+        self.total_bytes += data.nbytes
+        self.evict(timestamp)
+        return frame
+
+    def evict(self, now):
+        # Oldest frames go first, whichever limit (bytes or age) is hit.
+        while self.frames and (self.total_bytes > self.max_bytes or now - self.frames[0][1] > self.max_seconds):
+            _, _, data = self.frames.popleft()
+            self.total_bytes -= data.nbytes
+            self.evicted += 1
+
+    def decode(self, data):
+        return cv2.imdecode(data, cv2.IMREAD_COLOR) if self.encoding == "jpeg" else data
+
+    def window(self, source, start, end):
+        return [(timestamp, data) for frame_source, timestamp, data in self.frames
+                if frame_source == source and start <= timestamp <= end]
+
+
+class ClipRecorder(FrameSink):
+    def __init__(self, output_dir, pre_seconds=5.0, post_seconds=5.0, max_bytes=64 * 1024 * 1024, scale=0.5,
+                 encoding="jpeg", quality=80, fourcc="mp4v", queue_size=64):
+        self.output_dir = output_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        # Only the pre-roll is buffered; once a clip is open, frames are written as
+        # they arrive, so extending a clip never loses its start.
+        self.buffer = FrameRingBuffer(max_bytes, pre_seconds + 1.0, scale, encoding, quality)
+        self.clips = {}
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.triggers = queue.SimpleQueue()
+        self.stats = {"frames": 0, "dropped": 0, "clips": 0}
+        os.makedirs(output_dir, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, frame, source=None, index=None):
+        # Downscaling, encoding and clip writing happen on the recorder thread; the
+        # render loop only hands over the frame and drops it if the recorder falls behind.
+        try:
+            self.queue.put_nowait((source, time.time(), frame))
+        except queue.Full:
+            self.stats["dropped"] += 1
+            metrics.inc("sink_frames_dropped_total", sink="clip")
+
+    def trigger(self, source=None):
+        # Triggers have their own unbounded queue so an alert never blocks the
+        # render thread and is never dropped with the frames.
+        self.triggers.put((source, time.time()))
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                item = False
+
+            self._handle_triggers()
+            if item is None:
+                break
+            if item:
+                source, timestamp, frame = item
+                frame = self.buffer.append(source, timestamp, frame)
+                self.stats["frames"] += 1
+                if frame is not None and source in self.clips:
+                    self._write_frame(self.clips[source], frame)
+
+            now = time.time()
+            for source, clip in list(self.clips.items()):
+                if now >= clip["end"]:
+                    self._finish_clip(source)
+
+        for source in list(self.clips):
+            self._finish_clip(source)
+
+    def _handle_triggers(self):
+        while True:
+            try:
+                source, timestamp = self.triggers.get_nowait()
+            except queue.Empty:
+                return
+            if source in self.clips:
+                # A new detection while recording extends the same clip.
+                self.clips[source]["end"] = timestamp + self.post_seconds
+                continue
+
+            frames = self.buffer.window(source, timestamp - self.pre_seconds, timestamp)
+            duration = frames[-1][0] - frames[0][0] if frames else 0.0
+            fps = float(np.clip((len(frames) - 1) / duration, 1.0, 60.0)) if duration > 0 else 10.0
+            name = f"person_{source}_" if source else "person_"
+            path = os.path.join(self.output_dir, f"{name}{datetime.fromtimestamp(timestamp):%Y%m%d_%H%M%S}.mp4")
+            clip = {"path": path, "fps": fps, "end": timestamp + self.post_seconds, "writer": None, "frames": 0}
+            self.clips[source] = clip
+            for _, data in frames:
+                self._write_frame(clip, self.buffer.decode(data))
+
+    def _write_frame(self, clip, frame):
+        with metrics.span("clip_write"):
+            if clip["writer"] is None:
+                h, w = frame.shape[:2]
+                clip["writer"] = cv2.VideoWriter(clip["path"], self.fourcc, clip["fps"], (w, h))
+            clip["writer"].write(frame)
+        clip["frames"] += 1
+
+    def _finish_clip(self, source):
+        clip = self.clips.pop(source)
+        if clip["writer"] is None:
+            return
+        clip["writer"].release()
+        self.stats["clips"] += 1
+        metrics.inc("clips_written_total")
+        print(f"Clip saved: {clip['path']} ({clip['frames']} frames)")
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class RetentionManager:
+    def __init__(self, directory, max_bytes=None, max_age_days=None, interval=300.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def list_files(self):
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.lower().endswith(RETAINED_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+        return sorted(files)
+
+    def enforce(self, now=None):
+        now = time.time() if now is None else now
+        files = self.list_files()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+
+        # Files past the age limit go first, then the oldest until the folder fits the quota.
+        for mtime, size, path in files:
+            expired = self.max_age_days is not None and now - mtime > self.max_age_days * 86400
+            over_quota = self.max_bytes is not None and total > self.max_bytes
+            if not expired and not over_quota:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        if removed:
+            metrics.inc("retention_files_removed_total", removed)
+            print(f"Retention: removed {removed} old files from {self.directory}")
+        metrics.set("retention_bytes", total)
+        return removed
+
+    def start(self):
+        self.enforce()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.enforce()
+
+    def close(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
@@ -0,0 +1,35 @@
+import cv2
+import numpy as np
+
+
+class RegionsOfInterest:
+    def __init__(self, polygons, frame_size=(1280, 720), margin=16):
+        self.polygons = [np.asarray(polygon, dtype=np.int32).reshape(-1, 2) for polygon in polygons]
+        if not self.polygons:
+            raise ValueError("At least one ROI polygon is required")
+
+        # The model only sees the bounding rectangle around all polygons.
+        points = np.vstack(self.polygons)
+        w, h = frame_size
+        x1, y1 = np.maximum(points.min(axis=0) - margin, 0)
+        x2, y2 = np.minimum(points.max(axis=0) + margin, (w, h))
+        self.rect = (int(x1), int(y1), int(x2 - x1), int(y2 - y1))
+
+    def crop(self, frame):
+        x, y, w, h = self.rect
+        return frame[y:y+h, x:x+w]
+
+    def to_frame(self, boxes):
+        x, y = self.rect[:2]
+        return [(x1 + x, y1 + y, x2 + x, y2 + y) + tuple(rest) for x1, y1, x2, y2, *rest in boxes]
+
+    def contains(self, box):
+        # A person counts as inside when their feet (bottom centre of the box) are.
+        foot = (float((box[0] + box[2]) / 2), float(box[3]))
+        return any(cv2.pointPolygonTest(polygon, foot, False) >= 0 for polygon in self.polygons)
+
+    def filter(self, boxes):
+        return [box for box in self.to_frame(boxes) if self.contains(box)]
+
+    def draw(self, frame):
+        cv2.polylines(frame, self.polygons, True, (255, 0, 255), 2)
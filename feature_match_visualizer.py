@@ -1,104 +1,151 @@
 import os
+import json
+import hashlib
 import numpy as np
 import matplotlib.pyplot as plt
-import glob
+from matplotlib.collections import LineCollection
+from match_store import iter_match_pairs
+from plot_pool import PlotRenderPool
+
+PLOT_NAMES = ("lines_points", "scatter_points", "motion_vectors", "cumulative_histogram", "angle_histogram")
+
+
+def compute_pair_stats(pts1, pts2):
+    vectors = pts2 - pts1
+    return {
+        "vectors": vectors,
+        "delta": np.linalg.norm(vectors, axis=1),
+        "angles": np.degrees(np.arctan2(vectors[:, 1], vectors[:, 0])),
+    }
+
+
+def render_pair_plots(visuals_root, pts1, pts2, index):
+    stats = compute_pair_stats(pts1, pts2)
+    plot_lines(visuals_root, pts1, pts2, stats, index)
+    plot_scatter(visuals_root, pts1, pts2, index)
+    plot_motion_vectors(visuals_root, pts1, stats, index)
+    plot_cumulative_histogram(visuals_root, stats, index)
+    plot_angle_histogram(visuals_root, stats, index)
+
+
+def plot_lines(visuals_root, pts1, pts2, stats, index):
+    delta = stats["delta"]
+    mean_delta = np.mean(delta)
+    max_delta = np.max(delta)
+    min_delta = np.min(delta)
+
+    plt.figure(figsize=(6, 6))
+    # One LineCollection instead of a plt.plot call per match.
+    plt.gca().add_collection(LineCollection(np.stack((pts1, pts2), axis=1), colors='gray', alpha=0.5, linewidths=1))
+    plt.scatter(pts1[:, 0], pts1[:, 1], color='blue', s=10, label='Frame t')
+    plt.scatter(pts2[:, 0], pts2[:, 1], color='red', s=10, label='Frame t+1')
+    plt.gca().invert_yaxis()
+    plt.legend()
+    plt.title("Lines Between Matched Keypoints")
+    plt.xlabel("X")
+    plt.ylabel("Y")
+    plt.text(10, 30, f"Points: {len(delta)}", fontsize=9)
+    plt.text(10, 50, f"Δ Mean: {mean_delta:.2f}", fontsize=9)
+    plt.text(10, 70, f"Δ Max: {max_delta:.2f}", fontsize=9)
+    plt.text(10, 90, f"Δ Min: {min_delta:.2f}", fontsize=9)
+    plt.savefig(os.path.join(visuals_root, f"lines_points_{index}.png"))
+    plt.close()
+
+
+def plot_scatter(visuals_root, pts1, pts2, index):
+    plt.figure(figsize=(6, 6))
+    plt.scatter(pts1[:, 0], pts1[:, 1], s=10, label='Frame t', color='blue')
+    plt.scatter(pts2[:, 0], pts2[:, 1], s=10, label='Frame t+1', color='orange')
+    plt.gca().invert_yaxis()
+    plt.legend()
+    plt.title("2D Scatter Plot of Keypoints")
+    plt.xlabel("X")
+    plt.ylabel("Y")
+    plt.savefig(os.path.join(visuals_root, f"scatter_points_{index}.png"))
+    plt.close()
+
+
+def plot_motion_vectors(visuals_root, pts1, stats, index):
+    vectors = stats["vectors"]
+    plt.figure(figsize=(6, 6))
+    plt.quiver(pts1[:, 0], pts1[:, 1],
+               vectors[:, 0], vectors[:, 1],
+               angles='xy', scale_units='xy', scale=1, color='purple')
+    plt.gca().invert_yaxis()
+    plt.title("Motion Vectors Between Keypoints")
+    plt.xlabel("X")
+    plt.ylabel("Y")
+    plt.savefig(os.path.join(visuals_root, f"motion_vectors_{index}.png"))
+    plt.close()
+
+
+def plot_cumulative_histogram(visuals_root, stats, index):
+    delta = stats["delta"]
+    sorted_d = np.sort(delta)
+    cumulative = np.arange(len(delta)) / len(delta)
+    plt.figure(figsize=(6, 4))
+    plt.plot(sorted_d, cumulative, color='green')
+    plt.title("Cumulative Histogram of Δ")
+    plt.xlabel("Δ (Pixel Distance)")
+    plt.ylabel("Cumulative Percentage")
+    plt.grid(True)
+    plt.savefig(os.path.join(visuals_root, f"cumulative_histogram_{index}.png"))
+    plt.close()
+
+
+def plot_angle_histogram(visuals_root, stats, index):
+    plt.figure(figsize=(6, 4))
+    plt.hist(stats["angles"], bins=36, color='teal', edgecolor='black')
+    plt.title("Histogram of Motion Angles")
+    plt.xlabel("Angle (degrees)")
+    plt.ylabel("Frequency")
+    plt.grid(True)
+    plt.savefig(os.path.join(visuals_root, f"angle_histogram_{index}.png"))
+    plt.close()
+
 
 class FeatureMatchVisualizer:
-    def __init__(self, project_root_path):
-        self.match_points_path = "C:\\Users\\King\\Downloads\\ProjectRealTimeSystems\\matched_points"
+    def __init__(self, project_root_path, match_points_path, workers=None):
+        self.match_points_path = match_points_path
         self.visuals_root = os.path.join(project_root_path, "FeatureMatchPlots")
+        self.workers = workers
+        self.manifest_path = os.path.join(self.visuals_root, "plot_manifest.json")
         os.makedirs(self.visuals_root, exist_ok=True)
 
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_manifest(self, manifest):
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+    def plots_exist(self, index):
+        return all(os.path.exists(os.path.join(self.visuals_root, f"{name}_{index}.png")) for name in PLOT_NAMES)
+
     def visualize_all(self):
-        files1 = sorted(glob.glob(os.path.join(self.match_points_path, "matched_points1_*.npy")))
-        files2 = sorted(glob.glob(os.path.join(self.match_points_path, "matched_points2_*.npy")))
-
-        for f1, f2 in zip(files1, files2):
-            index = f1.split("_")[-1].split(".")[0]
-            points1 = np.load(f1)
-            points2 = np.load(f2)
-
-            self.plot_lines(points1, points2, index)
-            self.plot_scatter(points1, points2, index)
-            self.plot_motion_vectors(points1, points2, index)
-            self.plot_cumulative_histogram(points1, points2, index)
-            self.plot_angle_histogram(points1, points2, index)
-
-        print(f"✅ All visualizations saved in: {self.visuals_root}")
-
-    def compute_delta(self, pts1, pts2):
-        return np.linalg.norm(pts1 - pts2, axis=1)
-
-
-    def plot_lines(self, pts1, pts2, index):
-        delta = self.compute_delta(pts1, pts2)
-        mean_delta = np.mean(delta)
-        max_delta = np.max(delta)
-        min_delta = np.min(delta)
-
-        plt.figure(figsize=(6, 6))
-        for pt1, pt2 in zip(pts1, pts2):
-            plt.plot([pt1[0], pt2[0]], [pt1[1], pt2[1]], color='gray', alpha=0.5, linewidth=1)
-        plt.scatter(pts1[:, 0], pts1[:, 1], color='blue', s=10, label='Frame t')
-        plt.scatter(pts2[:, 0], pts2[:, 1], color='red', s=10, label='Frame t+1')
-        plt.gca().invert_yaxis()
-        plt.legend()
-        plt.title("Lines Between Matched Keypoints")
-        plt.xlabel("X")
-        plt.ylabel("Y")
-        plt.text(10, 30, f"Points: {len(delta)}", fontsize=9)
-        plt.text(10, 50, f"Δ Mean: {mean_delta:.2f}", fontsize=9)
-        plt.text(10, 70, f"Δ Max: {max_delta:.2f}", fontsize=9)
-        plt.text(10, 90, f"Δ Min: {min_delta:.2f}", fontsize=9)
-        plt.savefig(os.path.join(self.visuals_root, f"lines_points_{index}.png"))
-        plt.close()
-
-    def plot_scatter(self, pts1, pts2, index):
-        plt.figure(figsize=(6, 6))
-        plt.scatter(pts1[:, 0], pts1[:, 1], s=10, label='Frame t', color='blue')
-        plt.scatter(pts2[:, 0], pts2[:, 1], s=10, label='Frame t+1', color='orange')
-        plt.gca().invert_yaxis()
-        plt.legend()
-        plt.title("2D Scatter Plot of Keypoints")
-        plt.xlabel("X")
-        plt.ylabel("Y")
-        plt.savefig(os.path.join(self.visuals_root, f"scatter_points_{index}.png"))
-        plt.close()
-
-    def plot_motion_vectors(self, pts1, pts2, index):
-        plt.figure(figsize=(6, 6))
-        plt.quiver(pts1[:, 0], pts1[:, 1],
-                   pts2[:, 0] - pts1[:, 0], pts2[:, 1] - pts1[:, 1],
-                   angles='xy', scale_units='xy', scale=1, color='purple')
-        plt.gca().invert_yaxis()
-        plt.title("Motion Vectors Between Keypoints")
-        plt.xlabel("X")
-        plt.ylabel("Y")
-        plt.savefig(os.path.join(self.visuals_root, f"motion_vectors_{index}.png"))
-        plt.close()
-
-    def plot_cumulative_histogram(self, pts1, pts2, index):
-        delta = self.compute_delta(pts1, pts2)
-        sorted_d = np.sort(delta)
-        cumulative = np.arange(len(delta)) / len(delta)
-        plt.figure(figsize=(6, 4))
-        plt.plot(sorted_d, cumulative, color='green')
-        plt.title("Cumulative Histogram of Δ")
-        plt.xlabel("Δ (Pixel Distance)")
-        plt.ylabel("Cumulative Percentage")
-        plt.grid(True)
-        plt.savefig(os.path.join(self.visuals_root, f"cumulative_histogram_{index}.png"))
-        plt.close()
-
-
-    def plot_angle_histogram(self, pts1, pts2, index):
-        vectors = pts2 - pts1
-        angles = np.degrees(np.arctan2(vectors[:, 1], vectors[:, 0]))
-        plt.figure(figsize=(6, 4))
-        plt.hist(angles, bins=36, color='teal', edgecolor='black')
-        plt.title("Histogram of Motion Angles")
-        plt.xlabel("Angle (degrees)")
-        plt.ylabel("Frequency")
-        plt.grid(True)
-        plt.savefig(os.path.join(self.visuals_root, f"angle_histogram_{index}.png"))
-        plt.close()
+        manifest = self.load_manifest()
+        rendered = 0
+        skipped = 0
+
+        with PlotRenderPool(self.workers) as pool:
+            for index, points1, points2 in iter_match_pairs(self.match_points_path):
+                points1 = np.array(points1, dtype=np.float64)
+                points2 = np.array(points2, dtype=np.float64)
+                digest = hashlib.sha1(points1.tobytes() + points2.tobytes()).hexdigest()
+
+                if manifest.get(str(index)) == digest and self.plots_exist(index):
+                    skipped += 1
+                    continue
+
+                pool.submit(render_pair_plots, self.visuals_root, points1, points2, index)
+                manifest[str(index)] = digest
+                rendered += 1
+
+        self.save_manifest(manifest)
+        print(f"✅ All visualizations saved in: {self.visuals_root} ({rendered} rendered, {skipped} unchanged)")
@@ -0,0 +1,114 @@
+import cv2
+import numpy as np
+
+
+def empty_match_arrays():
+    return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+
+def matches_to_arrays(matches):
+    count = len(matches)
+    return (np.fromiter((m.queryIdx for m in matches), dtype=np.intp, count=count),
+            np.fromiter((m.trainIdx for m in matches), dtype=np.intp, count=count),
+            np.fromiter((m.distance for m in matches), dtype=np.float32, count=count))
+
+
+class BruteForceMatcher:
+    def __init__(self, cross_check=True):
+        self.cross_check = cross_check
+        self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=cross_check)
+
+    def match(self, des1, des2):
+        return self.matcher.match(des1, des2)
+
+    def match_arrays(self, des1, des2):
+        # batchDistance is what BFMatcher runs internally, but it returns index and
+        # distance arrays instead of one DMatch object per match.
+        dist, nidx = cv2.batchDistance(des1, des2, cv2.CV_32S, normType=cv2.NORM_HAMMING, K=1,
+                                       crosscheck=self.cross_check)
+        query = np.flatnonzero(nidx[:, 0] >= 0)
+        return query, nidx[query, 0].astype(np.intp), dist[query, 0].astype(np.float32)
+
+
+class KnnRatioMatcher:
+    def __init__(self, ratio=0.75):
+        self.ratio = ratio
+        self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
+
+    def knn_match(self, des1, des2):
+        return self.matcher.knnMatch(des1, des2, k=2)
+
+    def match(self, des1, des2):
+        # Lowe ratio test; LSH can return fewer than two neighbours for a query.
+        good = []
+        for candidates in self.knn_match(des1, des2):
+            if len(candidates) == 2 and candidates[0].distance < self.ratio * candidates[1].distance:
+                good.append(candidates[0])
+        return good
+
+    def match_arrays(self, des1, des2):
+        if len(des2) < 2:
+            return empty_match_arrays()
+        dist, nidx = cv2.batchDistance(des1, des2, cv2.CV_32S, normType=cv2.NORM_HAMMING, K=2)
+        query = np.flatnonzero(dist[:, 0] < self.ratio * dist[:, 1])
+        return query, nidx[query, 0].astype(np.intp), dist[query, 0].astype(np.float32)
+
+
+class FlannLshMatcher(KnnRatioMatcher):
+    def __init__(self, ratio=0.75, table_number=6, key_size=12, multi_probe_level=1, checks=50):
+        self.ratio = ratio
+        index_params = dict(algorithm=6, table_number=table_number, key_size=key_size,
+                            multi_probe_level=multi_probe_level)
+        self.matcher = cv2.FlannBasedMatcher(index_params, dict(checks=checks))
+
+    def knn_match(self, des1, des2):
+        if len(des2) < 2:
+            return []
+        return self.matcher.knnMatch(des1, des2, k=2)
+
+    def match_arrays(self, des1, des2):
+        # FLANN only returns DMatch objects, so they are converted once here.
+        return matches_to_arrays(self.match(des1, des2))
+
+
+MATCHER_BACKENDS = {
+    "bruteforce": BruteForceMatcher,
+    "knn_ratio": KnnRatioMatcher,
+    "flann_lsh": FlannLshMatcher,
+}
+
+
+def create_matcher(name="bruteforce", **options):
+    if name not in MATCHER_BACKENDS:
+        raise ValueError(f"Unknown matcher backend: {name} (expected one of {', '.join(MATCHER_BACKENDS)})")
+    return MATCHER_BACKENDS[name](**options)
+
+
+class GridOrbDetector:
+    def __init__(self, nfeatures=500, grid=(4, 4), oversample=4):
+        self.nfeatures = nfeatures
+        self.grid = grid
+        self.per_cell = max(1, nfeatures // (grid[0] * grid[1]))
+        self.orb = cv2.ORB_create(nfeatures=nfeatures * oversample)
+
+    def detectAndCompute(self, gray, mask=None):
+        # Detect an oversampled set once, then keep the strongest keypoints in each
+        # grid cell so features do not all cluster on the most textured region.
+        keypoints = self.orb.detect(gray, mask)
+        if not keypoints:
+            return keypoints, None
+
+        points = np.asarray(cv2.KeyPoint_convert(keypoints)).reshape(-1, 2)
+        responses = np.array([kp.response for kp in keypoints])
+        h, w = gray.shape[:2]
+        rows, cols = self.grid
+        row = np.minimum((points[:, 1] * rows / h).astype(np.intp), rows - 1)
+        col = np.minimum((points[:, 0] * cols / w).astype(np.intp), cols - 1)
+        cells = row * cols + col
+
+        order = np.lexsort((-responses, cells))
+        sorted_cells = cells[order]
+        rank = np.arange(len(order)) - np.searchsorted(sorted_cells, sorted_cells, side="left")
+        keep = np.sort(order[rank < self.per_cell])
+
+        return self.orb.compute(gray, [keypoints[i] for i in keep])
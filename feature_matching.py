@@ -2,22 +2,51 @@ import cv2
 import numpy as np
 import time
 import os
+from feature_matchers import create_matcher, GridOrbDetector
+from match_store import MatchStoreWriter
+from instrumentation import metrics, COUNT_BUCKETS
+from frame_sinks import SinkGroup, SnapshotSink, WindowSink
+
+metrics.set_buckets("match_count", COUNT_BUCKETS)
 
 class FeatureMatcher:
-    def __init__(self, video_source, save_path, match_save_path):
+    def __init__(self, video_source, save_path, match_save_path, matcher="bruteforce", nfeatures=500, grid=None,
+                 matcher_options=None, max_frames=None, max_duration=25.0, display=True, sinks=None):
         self.video_source = video_source
         self.save_path = save_path
         self.match_save_path = match_save_path
-        self.orb = cv2.ORB_create(nfeatures=500)
-        self.bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+        if grid is not None:
+            self.orb = GridOrbDetector(nfeatures=nfeatures, grid=grid)
+        else:
+            self.orb = cv2.ORB_create(nfeatures=nfeatures)
+        self.matcher = create_matcher(matcher, **(matcher_options or {}))
+        self.max_frames = max_frames
+        self.max_duration = max_duration
+        self.sinks = sinks
+        if sinks is None:
+            # Default output: match_N.jpg for every pair, plus a window unless headless.
+            self.sinks = [SnapshotSink(match_save_path, prefix="match")]
+            if display:
+                self.sinks.append(WindowSink("Feature Matching", (1280, 720)))
+        self.frame_latencies = []
         self.pair_count = 1
         self.prev_frame = None
+        self.prev_keypoints = None
+        self.prev_descriptors = None
+        self.prev_points = None
 
         if not os.path.exists(self.save_path):
             os.makedirs(self.save_path)
 
         if not os.path.exists(self.match_save_path):
             os.makedirs(self.match_save_path)
+
+    def set_prev(self, gray, keypoints, descriptors, points):
+        self.prev_frame = gray
+        self.prev_keypoints = keypoints
+        self.prev_descriptors = descriptors
+        self.prev_points = points
+
     def match_features(self):
         cap = cv2.VideoCapture(self.video_source)
 
@@ -25,54 +54,71 @@ class FeatureMatcher:
             print("Error: Could not open video source")
             return
 
-        start_time = time.time()  
+        match_writer = MatchStoreWriter(self.match_save_path)
+        sinks = SinkGroup(self.sinks)
+        # Recorded files are cut by stream time (frame index / FPS) so a run covers
+        # the same frames on any machine; live sources fall back to wall-clock time.
+        fps = cap.get(cv2.CAP_PROP_FPS) if os.path.isfile(str(self.video_source)) else 0
+        start_time = time.perf_counter()
+        frame_index = 0
 
-        while True:
+        while self.max_frames is None or frame_index < self.max_frames:
             ret, frame = cap.read()
             if not ret:
                 break
 
-            elapsed_time = time.time() - start_time
-            if elapsed_time > 25:
+            elapsed_time = frame_index / fps if fps > 0 else time.perf_counter() - start_time
+            if self.max_duration is not None and elapsed_time > self.max_duration:
                 break
+            frame_index += 1
+            frame_start = time.perf_counter()
 
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
+            # Each frame is extracted once; its keypoints become the next "prev" set.
+            kp2, des2 = self.orb.detectAndCompute(gray, None)
+            points2 = np.asarray(cv2.KeyPoint_convert(kp2), dtype=np.float64).reshape(-1, 2)
+
             if self.prev_frame is None:
-                self.prev_frame = gray
+                self.set_prev(gray, kp2, des2, points2)
                 continue
 
-            kp1, des1 = self.orb.detectAndCompute(self.prev_frame, None)
-            kp2, des2 = self.orb.detectAndCompute(gray, None)
+            kp1, des1 = self.prev_keypoints, self.prev_descriptors
 
             if des1 is not None and des2 is not None:
-                matches = self.bf.match(des1, des2)
-                matches = sorted(matches, key=lambda x: x.distance)
-
-                img_matches = cv2.drawMatches(
-                    self.prev_frame, kp1, gray, kp2, matches[:25],
-                    None, flags=cv2.DrawMatchesFlags_NOT_DRAW_SINGLE_POINTS
-                )
-
-                cv2.namedWindow("Feature Matching", cv2.WINDOW_NORMAL)
-                cv2.resizeWindow("Feature Matching", 1280, 720)
-                cv2.imshow("Feature Matching", img_matches)
-
-                matched_points1 = np.array([kp1[m.queryIdx].pt for m in matches])
-                matched_points2 = np.array([kp2[m.trainIdx].pt for m in matches])
-
-                np.save(os.path.join(self.match_save_path, f"matched_points1_{self.pair_count}.npy"), matched_points1)
-                np.save(os.path.join(self.match_save_path, f"matched_points2_{self.pair_count}.npy"), matched_points2)
-
-                match_img_path = os.path.join(self.match_save_path, f"match_{self.pair_count}.jpg")
-                cv2.imwrite(match_img_path, img_matches)
-
+                query_idx, train_idx, distances = self.matcher.match_arrays(des1, des2)
+                order = np.argsort(distances, kind="stable")
+                query_idx, train_idx, distances = query_idx[order], train_idx[order], distances[order]
+
+                if sinks.needs_frames:
+                    # DMatch objects are only built for the 25 matches that get drawn.
+                    drawn = [cv2.DMatch(int(q), int(t), float(d))
+                             for q, t, d in zip(query_idx[:25], train_idx[:25], distances[:25])]
+                    img_matches = cv2.drawMatches(
+                        self.prev_frame, kp1, gray, kp2, drawn,
+                        None, flags=cv2.DrawMatchesFlags_NOT_DRAW_SINGLE_POINTS
+                    )
+                    sinks.write(img_matches, index=self.pair_count)
+
+                matched_points1 = self.prev_points[query_idx]
+                matched_points2 = points2[train_idx]
+
+                match_writer.append(self.pair_count, matched_points1, matched_points2)
+                metrics.inc("match_pairs_total")
+                metrics.observe("match_count", len(query_idx))
 
                 self.pair_count += 1
-                self.prev_frame = gray
-
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+                self.set_prev(gray, kp2, des2, points2)
+            elif des1 is None:
+                self.set_prev(gray, kp2, des2, points2)
+
+            frame_latency = time.perf_counter() - frame_start
+            self.frame_latencies.append(frame_latency)
+            metrics.inc("match_frames_total")
+            metrics.observe("match_frame_seconds", frame_latency)
+            if not sinks.poll():
                 break
 
+        match_writer.close()
+        sinks.close()
         cap.release()
-        cv2.destroyAllWindows()
@@ -0,0 +1,234 @@
+import queue
+import threading
+import time
+from instrumentation import metrics
+
+DROP_OLDEST = "drop_oldest"
+BLOCK = "block"
+
+
+class StageStats:
+    def __init__(self, name, labels=None):
+        self.name = name
+        self.labels = dict(labels or {}, stage=name)
+        self.processed = 0
+        self.dropped = 0
+        self.total_latency = 0.0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, latency):
+        with self.lock:
+            self.processed += 1
+            self.total_latency += latency
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+        metrics.inc("pipeline_frames_total", **self.labels)
+        metrics.observe("pipeline_stage_latency_seconds", latency, **self.labels)
+
+    def record_drop(self):
+        with self.lock:
+            self.dropped += 1
+        metrics.inc("pipeline_frames_dropped_total", **self.labels)
+
+    def snapshot(self):
+        with self.lock:
+            mean_latency = self.total_latency / self.processed if self.processed else 0.0
+            return {
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "mean_latency_ms": mean_latency * 1000,
+                "last_latency_ms": self.last_latency * 1000,
+                "max_latency_ms": self.max_latency * 1000,
+            }
+
+
+class FrameQueue:
+    def __init__(self, maxsize, backpressure, stats):
+        if backpressure not in (DROP_OLDEST, BLOCK):
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.backpressure = backpressure
+        self.stats = stats
+
+    def put(self, item, stop_event):
+        if self.backpressure == DROP_OLDEST:
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self.stats.record_drop()
+                    except queue.Empty:
+                        pass
+
+        while not stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, stop_event):
+        while not stop_event.is_set():
+            try:
+                return self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+
+class LatestFrameGrabber:
+    def __init__(self, cap, stats, drop_frames=True, frame_event=None):
+        self.cap = cap
+        self.stats = stats
+        self.drop_frames = drop_frames
+        # Optional event shared by several grabbers, set on every new frame.
+        self.frame_event = frame_event
+        self.frame = None
+        self.frame_id = 0
+        self.consumed_id = 0
+        self.finished = False
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def start(self, stop_event):
+        self.thread = threading.Thread(target=self._capture_loop, args=(stop_event,), daemon=True)
+        self.thread.start()
+
+    def _capture_loop(self, stop_event):
+        while not stop_event.is_set():
+            if not self.drop_frames:
+                # Recorded files are replayed frame by frame instead of racing ahead.
+                with self.condition:
+                    while self.consumed_id < self.frame_id and not stop_event.is_set():
+                        self.condition.wait(timeout=0.1)
+
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            captured_at = time.perf_counter()
+            self.stats.record(captured_at - start)
+
+            with self.condition:
+                # Only the newest frame is kept; an unread one is overwritten.
+                if self.frame is not None and self.consumed_id < self.frame_id:
+                    self.stats.record_drop()
+                self.frame = (frame, captured_at)
+                self.frame_id += 1
+                self.condition.notify_all()
+            if self.frame_event is not None:
+                self.frame_event.set()
+
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+        if self.frame_event is not None:
+            self.frame_event.set()
+
+    def read(self, stop_event):
+        with self.condition:
+            while self.consumed_id == self.frame_id and not self.finished and not stop_event.is_set():
+                self.condition.wait(timeout=0.1)
+            return self._take()
+
+    def poll(self):
+        with self.condition:
+            return self._take()
+
+    def _take(self):
+        if self.consumed_id == self.frame_id:
+            return None
+        self.consumed_id = self.frame_id
+        self.condition.notify_all()
+        frame, captured_at = self.frame
+        return self.frame_id, captured_at, frame
+
+    def is_exhausted(self):
+        with self.condition:
+            return self.finished and self.consumed_id == self.frame_id
+
+
+class FramePipeline:
+    def __init__(self, cap, preprocess, infer, queue_size=2, backpressure=DROP_OLDEST, drop_frames=True):
+        self.preprocess = preprocess
+        self.infer = infer
+        self.stop_event = threading.Event()
+        self.stats = {name: StageStats(name) for name in ("capture", "preprocess", "infer", "render", "end_to_end")}
+        self.grabber = LatestFrameGrabber(cap, self.stats["capture"], drop_frames)
+        self.infer_queue = FrameQueue(queue_size, backpressure, self.stats["preprocess"])
+        self.render_queue = FrameQueue(queue_size, backpressure, self.stats["infer"])
+        self.workers = []
+
+    def start(self):
+        self.grabber.start(self.stop_event)
+        self.workers = [
+            threading.Thread(target=self._preprocess_loop, daemon=True),
+            threading.Thread(target=self._infer_loop, daemon=True),
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def _preprocess_loop(self):
+        while not self.stop_event.is_set():
+            item = self.grabber.read(self.stop_event)
+            if item is None:
+                break
+            frame_id, captured_at, frame = item
+            start = time.perf_counter()
+            processed = self.preprocess(frame)
+            self.stats["preprocess"].record(time.perf_counter() - start)
+            self.infer_queue.put((frame_id, captured_at, processed), self.stop_event)
+        self.infer_queue.put(None, self.stop_event)
+
+    def _infer_loop(self):
+        while not self.stop_event.is_set():
+            item = self.infer_queue.get(self.stop_event)
+            if item is None:
+                break
+            frame_id, captured_at, frame = item
+            start = time.perf_counter()
+            result = self.infer(frame)
+            self.stats["infer"].record(time.perf_counter() - start)
+            self.render_queue.put((frame_id, captured_at, frame, result), self.stop_event)
+        self.render_queue.put(None, self.stop_event)
+
+    def run(self, render):
+        # The render stage stays on the calling thread because cv2.imshow
+        # must be driven from the thread that owns the window.
+        self.start()
+        try:
+            while not self.stop_event.is_set():
+                item = self.render_queue.get(self.stop_event)
+                if item is None:
+                    break
+                frame_id, captured_at, frame, result = item
+                start = time.perf_counter()
+                keep_running = render(frame, result)
+                finished = time.perf_counter()
+                self.stats["render"].record(finished - start)
+                self.stats["end_to_end"].record(finished - captured_at)
+                if keep_running is False:
+                    break
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.stop_event.set()
+        for worker in self.workers:
+            worker.join(timeout=1.0)
+        if self.grabber.thread is not None:
+            self.grabber.thread.join(timeout=1.0)
+
+    def get_stats(self):
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+    def print_stats(self):
+        print("\nPipeline Stage Stats:")
+        for name, snapshot in self.get_stats().items():
+            print(f"{name:>10}: processed={snapshot['processed']} dropped={snapshot['dropped']} "
+                  f"mean={snapshot['mean_latency_ms']:.1f}ms max={snapshot['max_latency_ms']:.1f}ms")
@@ -0,0 +1,326 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+from frame_pipeline import FrameQueue, StageStats, DROP_OLDEST
+from instrumentation import metrics
+
+
+class JpegEncoder:
+    def __init__(self, workers=2, quality=95):
+        # cv2.imencode releases the GIL, so a thread pool encodes in parallel.
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.workers = workers
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+
+    def encode(self, frame):
+        with metrics.span("jpeg_encode"):
+            ok, jpeg = cv2.imencode(".jpg", frame, self.params)
+        return jpeg.tobytes() if ok else None
+
+    def save(self, frame, path):
+        jpeg = self.encode(frame)
+        if jpeg is not None:
+            with open(path, "wb") as f:
+                f.write(jpeg)
+
+    def submit(self, frame):
+        return self.executor.submit(self.encode, frame)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+class FrameSink:
+    needs_frames = True
+
+    def write(self, frame, source=None, index=None):
+        raise NotImplementedError
+
+    def poll(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class NullSink(FrameSink):
+    needs_frames = False
+
+    def write(self, frame, source=None, index=None):
+        pass
+
+
+class WindowSink(FrameSink):
+    def __init__(self, title, size=None):
+        # imshow/waitKey must run on the thread that owns the window, so write and
+        # poll are only called from the render loop.
+        self.title = title
+        self.size = size
+        self.windows = set()
+
+    def window_name(self, source):
+        return f"{self.title} - {source}" if source else self.title
+
+    def write(self, frame, source=None, index=None):
+        name = self.window_name(source)
+        if name not in self.windows:
+            cv2.namedWindow(name, cv2.WINDOW_NORMAL)
+            if self.size:
+                cv2.resizeWindow(name, *self.size)
+            self.windows.add(name)
+        cv2.imshow(name, frame)
+
+    def poll(self):
+        if not self.windows:
+            return True
+        return not (cv2.waitKey(1) & 0xFF == ord('q'))
+
+    def close(self):
+        for name in self.windows:
+            cv2.destroyWindow(name)
+        self.windows = set()
+
+
+class MjpegHttpSink(FrameSink):
+    def __init__(self, port=8081, host="0.0.0.0", encoder=None, max_fps=15.0):
+        self.encoder = encoder or JpegEncoder()
+        self.owns_encoder = encoder is None
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.latest = {}
+        self.last_write = {}
+        self.pending = 0
+        self.clients = 0
+        self.condition = threading.Condition()
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"MJPEG stream available at http://{host}:{self.server.server_port}/")
+
+    @property
+    def needs_frames(self):
+        # Nothing is drawn or encoded while nobody is watching.
+        return self.clients > 0
+
+    def make_handler(self):
+        sink = self
+
+        class MjpegHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                source = self.path.strip("/") or None
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.end_headers()
+                with sink.condition:
+                    sink.clients += 1
+                try:
+                    sink.stream(self.wfile, source)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with sink.condition:
+                        sink.clients -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return MjpegHandler
+
+    def stream(self, wfile, source):
+        last_sent = None
+        while self.server is not None:
+            with self.condition:
+                self.condition.wait_for(lambda: self.server is None or self.frame_for(source) is not last_sent, timeout=1.0)
+                jpeg = self.frame_for(source)
+            if jpeg is None or jpeg is last_sent:
+                continue
+            last_sent = jpeg
+            wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: " + str(len(jpeg)).encode() + b"\r\n\r\n")
+            wfile.write(jpeg + b"\r\n")
+            wfile.flush()
+
+    def frame_for(self, source):
+        if source is None and source not in self.latest and self.latest:
+            return next(iter(self.latest.values()))
+        return self.latest.get(source)
+
+    def write(self, frame, source=None, index=None):
+        now = time.monotonic()
+        # Frames are dropped while the encoder pool is busy or above max_fps.
+        if self.pending >= self.encoder.workers or now - self.last_write.get(source, 0.0) < self.min_interval:
+            metrics.inc("sink_frames_dropped_total", sink="mjpeg")
+            return
+        self.last_write[source] = now
+        with self.condition:
+            self.pending += 1
+        self.encoder.submit(frame).add_done_callback(lambda future: self.publish(source, future))
+
+    def publish(self, source, future):
+        with self.condition:
+            self.pending -= 1
+            jpeg = future.result()
+            if jpeg is not None:
+                self.latest[source] = jpeg
+            self.condition.notify_all()
+
+    def close(self):
+        server, self.server = self.server, None
+        if server is not None:
+            with self.condition:
+                self.condition.notify_all()
+            server.shutdown()
+            server.server_close()
+        if self.owns_encoder:
+            self.encoder.close()
+
+
+class RollingVideoSink(FrameSink):
+    def __init__(self, directory, fps=15.0, segment_seconds=300, max_segments=12, fourcc="mp4v", queue_size=32):
+        self.directory = directory
+        self.fps = fps
+        self.segment_frames = max(1, int(fps * segment_seconds))
+        self.max_segments = max_segments
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.writers = {}
+        self.segment_count = 0
+        self.stats = StageStats("video_sink")
+        self.queue = FrameQueue(queue_size, DROP_OLDEST, self.stats)
+        self.stop_event = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, frame, source=None, index=None):
+        self.queue.put((source, frame), self.stop_event)
+
+    def _run(self):
+        # VideoWriter encodes synchronously, so it runs off the render thread.
+        while True:
+            item = self.queue.get(self.stop_event)
+            if item is None:
+                break
+            source, frame = item
+            start = time.perf_counter()
+            self._write_frame(source, frame)
+            self.stats.record(time.perf_counter() - start)
+        for writer, _ in self.writers.values():
+            writer.release()
+        self.writers = {}
+
+    def _write_frame(self, source, frame):
+        if not self.needs_frames:
+            return
+        writer, frames = self.writers.get(source, (None, 0))
+        if writer is None or frames >= self.segment_frames:
+            if writer is not None:
+                writer.release()
+            writer = self._open_segment(source, frame)
+            if writer is None:
+                return
+            frames = 0
+        writer.write(frame)
+        self.writers[source] = (writer, frames + 1)
+
+    def _open_segment(self, source, frame):
+        prefix = f"segment_{source}_" if source else "segment_"
+        # Exact match, so camera "door" never rotates out "door_back" (or unnamed) segments.
+        pattern = re.compile(re.escape(prefix) + r"\d{8}_\d{6}_\d{4}\.mp4")
+        segments = sorted(name for name in os.listdir(self.directory) if pattern.fullmatch(name))
+        for name in segments[:max(0, len(segments) - self.max_segments + 1)]:
+            os.remove(os.path.join(self.directory, name))
+
+        self.segment_count += 1
+        path = os.path.join(self.directory, f"{prefix}{time.strftime('%Y%m%d_%H%M%S')}_{self.segment_count:04d}.mp4")
+        h, w = frame.shape[:2]
+        writer = cv2.VideoWriter(path, self.fourcc, self.fps, (w, h))
+        if not writer.isOpened():
+            # Usually a missing codec; the sink turns itself off instead of silently dropping every frame.
+            print(f"Error: could not open video writer for {path}, rolling video recording is disabled")
+            metrics.inc("sink_errors_total", sink="video")
+            self.needs_frames = False
+            return None
+        return writer
+
+    def close(self):
+        self.queue.put(None, self.stop_event)
+        self.thread.join()
+
+
+class SnapshotSink(FrameSink):
+    def __init__(self, directory, prefix="frame", every_n=1, interval=None, encoder=None, max_pending=None):
+        self.directory = directory
+        self.prefix = prefix
+        self.every_n = max(1, every_n)
+        self.interval = interval
+        self.encoder = encoder or JpegEncoder()
+        self.owns_encoder = encoder is None
+        self.max_pending = max_pending or 2 * self.encoder.workers
+        self.counts = {}
+        self.last_snapshot = {}
+        self.pending = []
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, frame, source=None, index=None):
+        count = self.counts.get(source, 0) + 1
+        self.counts[source] = count
+        now = time.monotonic()
+        if count % self.every_n:
+            return
+        if self.interval is not None and now - self.last_snapshot.get(source, -self.interval) < self.interval:
+            return
+        self.last_snapshot[source] = now
+
+        name = "_".join(str(part) for part in (self.prefix, source, index if index is not None else count) if part is not None)
+        path = os.path.join(self.directory, f"{name}.jpg")
+        self.pending = [future for future in self.pending if not future.done()]
+        # Every snapshot is kept, so the caller waits for the oldest save instead of
+        # queueing full-resolution frames without limit.
+        while len(self.pending) >= self.max_pending:
+            self.pending.pop(0).result()
+        self.pending.append(self.encoder.executor.submit(self.encoder.save, frame, path))
+
+    def close(self):
+        for future in self.pending:
+            future.result()
+        self.pending = []
+        if self.owns_encoder:
+            self.encoder.close()
+
+
+class SinkGroup:
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    @property
+    def needs_frames(self):
+        return any(sink.needs_frames for sink in self.sinks)
+
+    def write(self, frame, source=None, index=None):
+        for sink in self.sinks:
+            if sink.needs_frames:
+                sink.write(frame, source, index)
+
+    def poll(self):
+        return all([sink.poll() for sink in self.sinks])
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+SINK_TYPES = {
+    "none": NullSink,
+    "window": WindowSink,
+    "mjpeg": MjpegHttpSink,
+    "video": RollingVideoSink,
+    "snapshot": SnapshotSink,
+}
+
+
+def create_sink(name, **options):
+    if name not in SINK_TYPES:
+        raise ValueError(f"Unknown frame sink: {name}")
+    return SINK_TYPES[name](**options)
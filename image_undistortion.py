@@ -2,12 +2,15 @@ import cv2
 import numpy as np
 import glob
 import os
+from undistortion_map import get_undistortion_map
+from instrumentation import metrics
 
 class ImageUndistorter:
-    def __init__(self, camera_matrix, distortion_coeffs, image_path):
+    def __init__(self, camera_matrix, distortion_coeffs, image_path, map_cache_dir=None):
         self.camera_matrix = camera_matrix
         self.distortion_coeffs = distortion_coeffs
         self.image_path = image_path
+        self.map_cache_dir = map_cache_dir
 
     def undistort_images(self):
         images = glob.glob(os.path.join(self.image_path, 'calibrated_*.jpg'))  # מחפש תמונות עם פינות מסומנות
@@ -20,12 +23,11 @@ class ImageUndistorter:
             img = cv2.imread(img_file)
             h, w = img.shape[:2]
 
-            new_camera_matrix, roi = cv2.getOptimalNewCameraMatrix(self.camera_matrix, self.distortion_coeffs, (w, h), 1, (w, h))
-
-            undistorted_img = cv2.undistort(img, self.camera_matrix, self.distortion_coeffs, None, new_camera_matrix)
-
-            x, y, w, h = roi
-            undistorted_img = undistorted_img[y:y+h, x:x+w]
+            with metrics.span("undistort_image"):
+                undistortion_map = get_undistortion_map(self.camera_matrix, self.distortion_coeffs, (w, h), alpha=1,
+                                                        cache_dir=self.map_cache_dir)
+                undistorted_img = undistortion_map.apply(img, crop=True)
+            metrics.inc("undistorted_images_total")
 
             output_file = os.path.join(self.image_path, f"undistorted_{os.path.basename(img_file)}")
             cv2.imwrite(output_file, undistorted_img)
@@ -0,0 +1,188 @@
+import os
+import cv2
+import numpy as np
+
+PERSON_CLASS_ID = 0
+
+
+def letterbox(frame, size=640):
+    h, w = frame.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    return canvas, scale, (pad_x, pad_y)
+
+
+def nms(boxes, scores, iou_threshold):
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores)
+    keep = []
+
+    while order.size:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        intersection = w * h
+        iou = intersection / (areas[best] + areas[rest] - intersection + 1e-9)
+        order = rest[iou <= iou_threshold]
+
+    return np.array(keep, dtype=np.intp)
+
+
+def postprocess(output, scale, pad, frame_shape, conf_threshold=0.25, iou_threshold=0.45):
+    # YOLOv8 output is (84, anchors): cx, cy, w, h followed by one score per class.
+    # Only the person row is read, so the other 79 classes are never decoded.
+    scores = output[4 + PERSON_CLASS_ID]
+    candidates = scores >= conf_threshold
+    if not np.any(candidates):
+        return []
+
+    cx, cy, w, h = output[:4, candidates]
+    scores = scores[candidates]
+    boxes = np.stack((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2), axis=1)
+    boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad[0]) / scale
+    boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad[1]) / scale
+    # Boxes reaching into the letterbox padding would otherwise leave the frame.
+    h, w = frame_shape[:2]
+    boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, w - 1)
+    boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, h - 1)
+
+    keep = nms(boxes, scores, iou_threshold)
+    return [tuple(float(v) for v in box) + (float(score),) for box, score in zip(boxes[keep], scores[keep])]
+
+
+class InferenceBackend:
+    def predict(self, frames):
+        raise NotImplementedError
+
+    def warmup(self, shape=(720, 1280, 3), runs=2):
+        frame = np.zeros(shape, dtype=np.uint8)
+        for _ in range(runs):
+            self.predict([frame])
+
+
+class UltralyticsBackend(InferenceBackend):
+    def __init__(self, weights="yolov8s.pt", imgsz=640, conf_threshold=0.25, iou_threshold=0.45, threads=None):
+        from ultralytics import YOLO
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = YOLO(weights)
+        self.imgsz = imgsz
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+
+    def predict(self, frames):
+        results = self.model(frames, verbose=False, imgsz=self.imgsz, conf=self.conf_threshold,
+                             iou=self.iou_threshold, classes=[PERSON_CLASS_ID])
+        person_boxes = []
+        for result in results:
+            boxes = result.boxes.xyxy.cpu().numpy()
+            scores = result.boxes.conf.cpu().numpy()
+            person_boxes.append([tuple(float(v) for v in box) + (float(score),) for box, score in zip(boxes, scores)])
+        return person_boxes
+
+
+class LetterboxBackend(InferenceBackend):
+    # Shared pre/postprocessing for raw YOLOv8 exports; subclasses provide run(blob).
+    def __init__(self, imgsz=640, conf_threshold=0.25, iou_threshold=0.45):
+        self.imgsz = imgsz
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+
+    def run(self, blob):
+        raise NotImplementedError
+
+    def predict(self, frames):
+        letterboxed = [letterbox(frame, self.imgsz) for frame in frames]
+        blob = cv2.dnn.blobFromImages([image for image, _, _ in letterboxed], 1 / 255.0, swapRB=True)
+        outputs = self.run(blob)
+        return [postprocess(output, scale, pad, frame.shape, self.conf_threshold, self.iou_threshold)
+                for output, frame, (_, scale, pad) in zip(outputs, frames, letterboxed)]
+
+
+class OnnxRuntimeBackend(LetterboxBackend):
+    def __init__(self, onnx_path, imgsz=640, conf_threshold=0.25, iou_threshold=0.45, threads=None):
+        super().__init__(imgsz, conf_threshold, iou_threshold)
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Models exported without dynamic=True only accept a batch of one.
+        self.fixed_batch = isinstance(model_input.shape[0], int)
+
+    def run(self, blob):
+        if self.fixed_batch and len(blob) > 1:
+            return np.concatenate([self.session.run(None, {self.input_name: blob[i:i + 1]})[0] for i in range(len(blob))])
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenCvDnnBackend(LetterboxBackend):
+    def __init__(self, onnx_path, imgsz=640, conf_threshold=0.25, iou_threshold=0.45, threads=None):
+        super().__init__(imgsz, conf_threshold, iou_threshold)
+        if threads:
+            cv2.setNumThreads(threads)
+        self.net = cv2.dnn.readNetFromONNX(onnx_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def run(self, blob):
+        outputs = []
+        for i in range(len(blob)):
+            self.net.setInput(blob[i:i + 1])
+            outputs.append(self.net.forward())
+        return np.concatenate(outputs)
+
+
+def export_onnx(weights="yolov8s.pt", imgsz=640, dynamic=True):
+    from ultralytics import YOLO
+    return YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=dynamic)
+
+
+def quantize_onnx(onnx_path, output_path):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(onnx_path, output_path, weight_type=QuantType.QUInt8)
+    return output_path
+
+
+def create_backend(name="ultralytics", weights="yolov8s.pt", onnx_path=None, int8=False, **options):
+    if name == "ultralytics":
+        return UltralyticsBackend(weights, **options)
+
+    # The ONNX file is exported (and quantized) once and reused on later starts.
+    # onnxruntime takes a dynamic batch axis and OpenCV DNN a fixed one, so each
+    # graph gets its own cache file.
+    dynamic = name == "onnxruntime"
+    onnx_path = onnx_path or os.path.splitext(weights)[0] + (".dynamic.onnx" if dynamic else ".static.onnx")
+    if not os.path.exists(onnx_path):
+        print(f"Exporting {weights} to {onnx_path}")
+        exported = export_onnx(weights, options.get("imgsz", 640), dynamic=dynamic)
+        if os.path.abspath(exported) != os.path.abspath(onnx_path):
+            os.replace(exported, onnx_path)
+
+    if name == "onnxruntime":
+        if int8:
+            int8_path = os.path.splitext(onnx_path)[0] + ".int8.onnx"
+            if not os.path.exists(int8_path):
+                print(f"Quantizing {onnx_path} to {int8_path}")
+                quantize_onnx(onnx_path, int8_path)
+            onnx_path = int8_path
+        return OnnxRuntimeBackend(onnx_path, **options)
+
+    if name == "opencv_dnn":
+        if int8:
+            print("Warning: INT8 weights are only supported by the onnxruntime backend, using FP32")
+        return OpenCvDnnBackend(onnx_path, **options)
+
+    raise ValueError(f"Unknown inference backend: {name}")
@@ -0,0 +1,194 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+NULL_SPAN = nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        return {"count": self.count, "sum": self.sum, "mean": self.sum / self.count if self.count else 0.0}
+
+
+class Span:
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name + "_seconds", time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self, prefix="vision", enabled=False):
+        # Every call site checks self.enabled first, so a disabled registry costs
+        # one attribute lookup per call and spans reuse a shared null context.
+        self.prefix = prefix
+        self.enabled = enabled
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.server = None
+        self.logger_stop = None
+
+    def set_buckets(self, name, buckets):
+        self.buckets[name] = tuple(buckets)
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[(name, label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets.get(name, LATENCY_BUCKETS))
+            histogram.observe(value)
+
+    def span(self, name, **labels):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, labels)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": {name + format_labels(key): value for (name, key), value in self.counters.items()},
+                "gauges": {name + format_labels(key): value for (name, key), value in self.gauges.items()},
+                "histograms": {name + format_labels(key): histogram.snapshot()
+                               for (name, key), histogram in self.histograms.items()},
+            }
+
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            for kind, metrics in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({name for name, _ in metrics}):
+                    lines.append(f"# TYPE {self.prefix}_{name} {kind}")
+                    for (metric, key), value in sorted(metrics.items()):
+                        if metric == name:
+                            lines.append(f"{self.prefix}_{name}{format_labels(key)} {value}")
+
+            for name in sorted({name for name, _ in self.histograms}):
+                full_name = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {full_name} histogram")
+                for (metric, key), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f"{full_name}_bucket{format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{full_name}_sum{format_labels(key)} {histogram.sum}")
+                    lines.append(f"{full_name}_count{format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=9100, host="0.0.0.0"):
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Metrics available at http://{host}:{self.server.server_port}/metrics")
+        return self.server
+
+    def start_json_logger(self, path=None, interval=10.0):
+        self.logger_stop = threading.Event()
+
+        def log_loop(stop_event):
+            while not stop_event.wait(interval):
+                self.write_json(path)
+            self.write_json(path)
+
+        threading.Thread(target=log_loop, args=(self.logger_stop,), daemon=True).start()
+
+    def write_json(self, path=None):
+        line = json.dumps(dict(self.snapshot(), timestamp=time.time()))
+        if path is None:
+            print(line)
+            return
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def close(self):
+        if self.logger_stop is not None:
+            self.logger_stop.set()
+            self.logger_stop = None
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+metrics = MetricsRegistry()
+
+
+def enable_metrics(port=None, json_log_path=None, json_interval=10.0, host="0.0.0.0"):
+    metrics.enabled = True
+    if port is not None:
+        metrics.serve(port, host)
+    if json_log_path is not None:
+        metrics.start_json_logger(None if json_log_path == "-" else json_log_path, json_interval)
+    return metrics
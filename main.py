@@ -1,57 +1,264 @@
-from camera_calibration import CameraCalibration
-from image_undistortion import ImageUndistorter
-from feature_matching import FeatureMatcher
-from triangulation_3d import Triangulation3D
-from feature_match_visualizer import FeatureMatchVisualizer 
-from person_detector import PersonDetector 
+import argparse
+import json
+import os
+
+# Stage modules are imported inside the methods that use them, so a subcommand
+# only pays for its own dependencies (matplotlib and ultralytics/torch are the slow ones).
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_CONFIG = {
+    "image_path": os.path.join(PROJECT_ROOT, "checkboardImages"),
+    "match_save_path": os.path.join(PROJECT_ROOT, "matched_points"),
+    "output_3d_path": os.path.join(PROJECT_ROOT, "triangulated_3D"),
+    "checkerboard_size": [10, 7],
+    "video_source": "0",
+    "calibration_workers": None,
+    "detect_width": None,
+    "matcher": "bruteforce",
+    "nfeatures": 500,
+    "max_frames": None,
+    "max_duration": 25.0,
+    "headless": False,
+    "plot_workers": None,
+    "pose_mode": "fixed",
+    "voxel_size": 0.05,
+    "backend": "ultralytics",
+    "threads": None,
+    "int8": False,
+    "alert_config": None,
+    "metrics_port": None,
+    "metrics_log": None,
+}
+
+
+def parse_value(value, default):
+    if isinstance(default, bool):
+        return value.lower() in ("1", "true", "yes")
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    if default is None and value.lower() in ("none", "null"):
+        # Only keys that are unset by default can be unset again.
+        return None
+    if isinstance(default, list) or default is None:
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def check_key(key, source):
+    if key not in DEFAULT_CONFIG:
+        raise ValueError(f"Unknown config key: {key} (from {source})")
+
+
+def parse_setting(key, value, source):
+    try:
+        return parse_value(value, DEFAULT_CONFIG[key])
+    except ValueError:
+        raise ValueError(f"Invalid value for {key}: {value!r} (from {source})") from None
+
+
+def load_config(path=None, overrides=None):
+    config = dict(DEFAULT_CONFIG)
+
+    if path is not None:
+        with open(path, "r", encoding="utf-8") as f:
+            file_config = json.load(f)
+        for key in file_config:
+            check_key(key, path)
+        config.update(file_config)
+
+    # VISION_VIDEO_SOURCE etc. override the file; command-line values override both.
+    for key in DEFAULT_CONFIG:
+        name = f"VISION_{key.upper()}"
+        value = os.environ.get(name)
+        if value is not None:
+            config[key] = parse_setting(key, value, name)
+
+    for key, value in (overrides or {}).items():
+        check_key(key, "command line")
+        config[key] = parse_setting(key, value, "command line") if isinstance(value, str) else value
+
+    return config
+
+
+def video_source_arg(source):
+    # "0" means the first local camera; anything else is a file path or stream URL.
+    return int(source) if str(source).isdigit() else source
+
 
 class Main:
-    def __init__(self, checkerboard_size, image_path, video_source, match_save_path, output_3d_path):
+    def __init__(self, checkerboard_size, image_path, video_source, match_save_path, output_3d_path,
+                 metrics_port=None, metrics_log=None, options=None, dry_run=False):
+        self.checkerboard_size = tuple(checkerboard_size)
         self.image_path = image_path
-        self.video_source = video_source
+        self.video_source = video_source_arg(video_source)
         self.match_save_path = match_save_path
         self.output_3d_path = output_3d_path
-        self.calibration = CameraCalibration(checkerboard_size, image_path)
+        self.options = dict(DEFAULT_CONFIG, **(options or {}))
+        # A dry run imports each stage's modules and stops before doing any work;
+        # benchmark_startup.py uses it to time the real subcommands.
+        self.dry_run = dry_run
+        self.calibration = None
         self.undistorter = None
         self.feature_matching = None
         self.triangulation = None
+        if metrics_port is not None or metrics_log is not None:
+            from instrumentation import enable_metrics
+            enable_metrics(port=metrics_port, json_log_path=metrics_log)
+
+    @classmethod
+    def from_config(cls, config, dry_run=False):
+        return cls(config["checkerboard_size"], config["image_path"], config["video_source"],
+                   config["match_save_path"], config["output_3d_path"], config["metrics_port"],
+                   config["metrics_log"], options=config, dry_run=dry_run)
+
+    def calibrate(self):
+        from camera_calibration import CameraCalibration
+        from calibration_store import CalibrationStore
+        if self.dry_run:
+            return True
+
+        if self.calibration is None:
+            # Results are cached in the store, so later subcommands reuse them without re-detecting corners.
+            self.calibration = CameraCalibration(self.checkerboard_size, self.image_path,
+                                                 workers=self.options["calibration_workers"],
+                                                 detect_width=self.options["detect_width"])
+            self.calibration.calibrate_with_store(CalibrationStore(os.path.join(self.image_path, "calibration_store.json")))
+        return self.calibration.camera_matrix is not None and self.calibration.distortion_coeffs is not None
+
+    def undistort(self):
+        from image_undistortion import ImageUndistorter
+        if self.dry_run:
+            return
+        self.undistorter = ImageUndistorter(self.calibration.camera_matrix, self.calibration.distortion_coeffs, self.image_path)
+        self.undistorter.undistort_images()
+
+    def match(self):
+        from feature_matching import FeatureMatcher
+        if self.dry_run:
+            return
+        self.feature_matching = FeatureMatcher(self.video_source, self.image_path, self.match_save_path,
+                                               matcher=self.options["matcher"], nfeatures=self.options["nfeatures"],
+                                               max_frames=self.options["max_frames"],
+                                               max_duration=self.options["max_duration"],
+                                               display=not self.options["headless"])
+        self.feature_matching.match_features()
+
+    def visualize(self):
+        from feature_match_visualizer import FeatureMatchVisualizer
+        if self.dry_run:
+            return
+        ProjectPath = os.path.dirname(self.match_save_path)
+        visualizer = FeatureMatchVisualizer(ProjectPath, self.match_save_path, workers=self.options["plot_workers"])
+        visualizer.visualize_all()
+
+    def triangulate(self):
+        from triangulation_3d import Triangulation3D
+        if self.dry_run:
+            return
+        self.triangulation = Triangulation3D(self.calibration.camera_matrix, self.calibration.distortion_coeffs,
+                                             self.match_save_path, self.output_3d_path,
+                                             render_workers=self.options["plot_workers"],
+                                             pose_mode=self.options["pose_mode"], voxel_size=self.options["voxel_size"])
+        self.triangulation.triangulate_points()
+
+    def detect(self):
+        from person_detector import PersonDetector
+        if self.dry_run:
+            return
+        backend_options = {"name": self.options["backend"], "int8": self.options["int8"]}
+        if self.options["threads"] is not None:
+            backend_options["threads"] = self.options["threads"]
+        detector = PersonDetector(self.calibration.camera_matrix, self.calibration.distortion_coeffs,
+                                  video_source=self.video_source, alert_config_path=self.options["alert_config"],
+                                  backend_options=backend_options, headless=self.options["headless"])
+        detector.run()
+
+    def run_stage(self, stage):
+        if stage in ("match", "visualize"):
+            getattr(self, stage)()
+            return
 
-    def run(self):
         print("\nCamera Calibration : ")
-        self.calibration.collect_calibration_images()
-        self.calibration.calibrate_camera()
-        self.calibration.print_results()
+        if not self.calibrate():
+            print("Error: No calibration result available")
+            return
+        if not self.dry_run:
+            self.calibration.print_results()
 
-        if self.calibration.camera_matrix is not None and self.calibration.distortion_coeffs is not None:
-            print("\nStep 2 : ImageUndistorter  ")
-            self.undistorter = ImageUndistorter(self.calibration.camera_matrix, self.calibration.distortion_coeffs, self.image_path)
-            self.undistorter.undistort_images()
+        if stage == "all":
+            self.run_after_calibration()
+        elif stage != "calibrate":
+            getattr(self, stage)()
 
-            print("\nStep 3 :FeatureMatcher ")
-            self.feature_matching = FeatureMatcher(self.video_source, self.image_path, self.match_save_path)
-            self.feature_matching.match_features()
+    def run(self):
+        self.run_stage("all")
+        self.close()
 
-            print("\nPlotsForTheKeyPoints")
-            ProjectPath = r"C:\Users\King\Downloads\ProjectRealTimeSystems"
-            visualizer = FeatureMatchVisualizer(ProjectPath)
+    def run_after_calibration(self):
+        print("\nStep 2 : ImageUndistorter  ")
+        self.undistort()
 
-            visualizer.visualize_all()
+        print("\nStep 3 :FeatureMatcher ")
+        self.match()
 
-            print("\n🔹Step4: Triangulation3D")
-            self.triangulation = Triangulation3D(self.calibration.camera_matrix, self.calibration.distortion_coeffs, self.match_save_path, self.output_3d_path)
-            self.triangulation.triangulate_points()
+        print("\nPlotsForTheKeyPoints")
+        self.visualize()
 
-            #print("\nStep5 : PersonDetector  ")
-            #detector = PersonDetector(self.calibration.camera_matrix, self.calibration.distortion_coeffs)
-            #detector.run()
+        print("\n🔹Step4: Triangulation3D")
+        self.triangulate()
 
-if __name__ == "__main__":
-    image_path = r"C:\Users\King\Downloads\ProjectRealTimeSystems\checkboardImages"
-    match_save_path = r"C:\Users\King\Downloads\ProjectRealTimeSystems\matched_points"
-    output_3d_path = r"C:\Users\King\Downloads\ProjectRealTimeSystems\triangulated_3D"
-    checkerboard_size = (10, 7)
-    video_source = "http://192.168.1.7:8080/video"
+        # Detection runs until stopped, so it is started separately with the detect subcommand.
 
-    main_system = Main(checkerboard_size, image_path, video_source, match_save_path, output_3d_path)
-    main_system.run()
+    def close(self):
+        from instrumentation import metrics
+        metrics.close()
 
+
+STAGES = ("calibrate", "undistort", "match", "visualize", "triangulate", "detect", "all")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Real-time 3D vision and intrusion alert system.")
+    parser.add_argument("--config", default=None, help="JSON config file (keys as in DEFAULT_CONFIG).")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="Override one config key.")
+    parser.add_argument("--images", dest="image_path", default=None, help="Checkerboard image folder.")
+    parser.add_argument("--video", dest="video_source", default=None, help="Video file, stream URL or camera index.")
+    parser.add_argument("--matches", dest="match_save_path", default=None, help="Folder for matched points.")
+    parser.add_argument("--output-3d", dest="output_3d_path", default=None, help="Folder for triangulation output.")
+    parser.add_argument("--headless", action="store_const", const=True, default=None, help="Run without windows.")
+    parser.add_argument("--metrics-port", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="Load the stage's modules and exit without running it.")
+    subparsers = parser.add_subparsers(dest="stage", required=True)
+    for stage in STAGES:
+        subparsers.add_parser(stage, help=f"Run the {stage} stage" if stage != "all" else "Run calibrate to triangulate")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    overrides = dict(item.split("=", 1) for item in args.set)
+    for key in ("image_path", "video_source", "match_save_path", "output_3d_path", "headless", "metrics_port"):
+        if getattr(args, key) is not None:
+            overrides[key] = getattr(args, key)
+
+    try:
+        config = load_config(args.config, overrides)
+    except ValueError as error:
+        parser.error(str(error))
+    main_system = Main.from_config(config, dry_run=args.dry_run)
+    try:
+        main_system.run_stage(args.stage)
+    finally:
+        main_system.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import glob
+import os
+import queue
+import threading
+import numpy as np
+
+POINTS_FILE = "matches.f32"
+INDEX_FILE = "matches.idx"
+
+
+class MatchStoreWriter:
+    def __init__(self, path, flush_every=32, append=False):
+        self.path = path
+        self.flush_every = flush_every
+        os.makedirs(path, exist_ok=True)
+
+        mode = "ab" if append else "wb"
+        self.points_file = open(os.path.join(path, POINTS_FILE), mode)
+        self.index_file = open(os.path.join(path, INDEX_FILE), mode)
+        self.next_row = self.points_file.tell() // (4 * np.dtype(np.float32).itemsize)
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def append(self, pair_id, pts1, pts2):
+        rows = np.hstack((np.asarray(pts1, dtype=np.float32).reshape(-1, 2),
+                          np.asarray(pts2, dtype=np.float32).reshape(-1, 2)))
+        self.queue.put((pair_id, rows))
+
+    def _write_loop(self):
+        pending = []
+        while True:
+            item = self.queue.get()
+            if item is not None:
+                pending.append(item)
+            if pending and (item is None or len(pending) >= self.flush_every or self.queue.empty()):
+                self._flush(pending)
+                pending = []
+            if item is None:
+                break
+
+    def _flush(self, pending):
+        index = np.empty((len(pending), 3), dtype=np.int64)
+        for i, (pair_id, rows) in enumerate(pending):
+            self.points_file.write(rows.tobytes())
+            index[i] = (pair_id, self.next_row, len(rows))
+            self.next_row += len(rows)
+
+        # Points land on disk before the index entries that reference them.
+        self.points_file.flush()
+        self.index_file.write(index.tobytes())
+        self.index_file.flush()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.points_file.close()
+        self.index_file.close()
+
+
+class MatchStore:
+    def __init__(self, path):
+        self.path = path
+        points_path = os.path.join(path, POINTS_FILE)
+        index_path = os.path.join(path, INDEX_FILE)
+
+        total_rows = os.path.getsize(points_path) // (4 * np.dtype(np.float32).itemsize)
+        index = np.fromfile(index_path, dtype=np.int64)
+        index = index[:len(index) - len(index) % 3].reshape(-1, 3)
+
+        # Entries from an interrupted write that point past the data are ignored.
+        self.index = index[index[:, 1] + index[:, 2] <= total_rows]
+        self.points = np.memmap(points_path, dtype=np.float32, mode="r", shape=(total_rows, 4)) if total_rows else np.empty((0, 4), np.float32)
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, INDEX_FILE)) and os.path.exists(os.path.join(path, POINTS_FILE))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        for pair_id, offset, count in self.index:
+            block = self.points[offset:offset + count]
+            yield int(pair_id), block[:, :2], block[:, 2:]
+
+
+def iter_legacy_pairs(path):
+    def pair_id(file_name):
+        return int(os.path.basename(file_name).rsplit("_", 1)[-1].split(".")[0])
+
+    files1 = sorted(glob.glob(os.path.join(path, "matched_points1_*.npy")), key=pair_id)
+    files2 = sorted(glob.glob(os.path.join(path, "matched_points2_*.npy")), key=pair_id)
+
+    if len(files1) != len(files2):
+        print("Num Points dont match")
+        return
+
+    for f1, f2 in zip(files1, files2):
+        yield pair_id(f1), np.load(f1), np.load(f2)
+
+
+def iter_match_pairs(path):
+    if MatchStore.exists(path):
+        return iter(MatchStore(path))
+    return iter_legacy_pairs(path)
@@ -0,0 +1,69 @@
+import time
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    def __init__(self, method="diff", width=160, pixel_threshold=25, min_changed_ratio=0.002,
+                 keepalive_interval=5.0, history=500):
+        if method not in ("diff", "mog2"):
+            raise ValueError(f"Unknown motion gate method: {method}")
+        self.method = method
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_ratio = min_changed_ratio
+        self.keepalive_interval = keepalive_interval
+        self.previous = None
+        self.last_inference = None
+        self.subtractor = None
+        if method == "mog2":
+            self.subtractor = cv2.createBackgroundSubtractorMOG2(history=history, varThreshold=pixel_threshold,
+                                                                 detectShadows=False)
+        self.stats = {"frames": 0, "triggered": 0, "keepalive": 0, "skipped": 0}
+
+    def changed_ratio(self, frame):
+        # Motion is measured on a small blurred grayscale copy, which costs a
+        # fraction of a millisecond compared to a full inference.
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, int(h * self.width / w))), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+
+        if self.subtractor is not None:
+            mask = self.subtractor.apply(small)
+            return np.count_nonzero(mask) / mask.size
+
+        previous, self.previous = self.previous, small
+        if previous is None:
+            return 1.0
+        diff = cv2.absdiff(previous, small)
+        return np.count_nonzero(diff > self.pixel_threshold) / diff.size
+
+    def should_infer(self, frame, now=None):
+        now = time.monotonic() if now is None else now
+        self.stats["frames"] += 1
+
+        if self.changed_ratio(frame) >= self.min_changed_ratio:
+            self.stats["triggered"] += 1
+        elif self.last_inference is None or now - self.last_inference >= self.keepalive_interval:
+            self.stats["keepalive"] += 1
+        else:
+            self.stats["skipped"] += 1
+            return False
+
+        self.last_inference = now
+        return True
+
+    def get_stats(self):
+        frames = self.stats["frames"] or 1
+        return dict(self.stats,
+                    trigger_rate=self.stats["triggered"] / frames,
+                    skip_rate=self.stats["skipped"] / frames)
+
+    def print_stats(self, name=None):
+        stats = self.get_stats()
+        label = f" ({name})" if name else ""
+        print(f"Motion Gate{label}: frames={stats['frames']} triggered={stats['triggered']} "
+              f"keepalive={stats['keepalive']} skipped={stats['skipped']} "
+              f"trigger_rate={stats['trigger_rate']:.1%} skip_rate={stats['skip_rate']:.1%}")
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from frame_pipeline import LatestFrameGrabber, StageStats
+from instrumentation import metrics
+
+
+class MultiCameraDetector:
+    def __init__(self, detector, sources, batch_size=None, max_wait=0.05):
+        self.detector = detector
+        self.sources = dict(sources)
+        self.batch_size = batch_size or len(self.sources)
+        self.max_wait = max_wait
+        self.stop_event = threading.Event()
+        self.frame_event = threading.Event()
+        self.capture_stats = {name: StageStats("capture", {"camera": name}) for name in self.sources}
+        self.latencies = {name: [] for name in self.sources}
+        self.batch_sizes = []
+        self.elapsed = 0.0
+        self.poll_offset = 0
+
+    def collect_batch(self, grabbers):
+        # Take at most one (the newest) frame per camera, waiting up to max_wait
+        # for the batch to fill once the first frame is in.
+        batch = {}
+        deadline = None
+        # Polling starts one camera later each batch so that with batch_size below
+        # the camera count the later cameras are not starved.
+        names = list(grabbers)
+        if names:
+            offset = self.poll_offset % len(names)
+            names = names[offset:] + names[:offset]
+            self.poll_offset = offset + 1
+        while not self.stop_event.is_set():
+            # Cleared before polling, so a frame arriving after the poll wakes the wait below.
+            self.frame_event.clear()
+            for name in names:
+                grabber = grabbers[name]
+                if name not in batch and len(batch) < self.batch_size:
+                    item = grabber.poll()
+                    if item is not None:
+                        batch[name] = item
+
+            if len(batch) >= self.batch_size:
+                break
+            if all(grabber.is_exhausted() for name, grabber in grabbers.items() if name not in batch):
+                break
+            if batch and deadline is None:
+                deadline = time.perf_counter() + self.max_wait
+            timeout = 0.1
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.perf_counter())
+                if timeout <= 0:
+                    break
+            self.frame_event.wait(timeout)
+        return batch
+
+    def run(self, max_batches=None):
+        caps = {}
+        grabbers = {}
+        for name, source in self.sources.items():
+            cap = cv2.VideoCapture(source)
+            if not cap.isOpened():
+                print(f"Error: Could not open video source for camera {name}")
+                continue
+            caps[name] = cap
+            # Recorded files are replayed without dropping frames so runs are repeatable.
+            grabbers[name] = LatestFrameGrabber(cap, self.capture_stats[name], drop_frames=not os.path.isfile(str(source)),
+                                               frame_event=self.frame_event)
+
+        states = {name: self.detector.create_state(name) for name in grabbers}
+        if self.detector.retention is not None:
+            self.detector.retention.start()
+        for grabber in grabbers.values():
+            grabber.start(self.stop_event)
+
+        start = time.perf_counter()
+        keep_running = True
+        while keep_running and grabbers and (max_batches is None or len(self.batch_sizes) < max_batches):
+            batch = self.collect_batch(grabbers)
+            if not batch:
+                break
+
+            names = list(batch)
+            frames = [self.detector.preprocess(batch[name][2]) for name in names]
+            person_boxes = self.detector.detect_states(frames, [states[name] for name in names])
+            self.batch_sizes.append(len(frames))
+
+            for name, frame, person_box in zip(names, frames, person_boxes):
+                latency = time.perf_counter() - batch[name][1]
+                self.latencies[name].append(latency)
+                metrics.observe("pipeline_stage_latency_seconds", latency, stage="end_to_end", camera=name)
+                if self.detector.render(frame, person_box, states[name]) is False:
+                    keep_running = False
+
+        self.elapsed = time.perf_counter() - start
+        self.stop_event.set()
+        for name, grabber in grabbers.items():
+            grabber.thread.join(timeout=1.0)
+            caps[name].release()
+        self.detector.alert_dispatcher.close()
+        self.detector.sinks.close()
+        if self.detector.retention is not None:
+            self.detector.retention.close()
+        self.print_stats()
+        for name, state in states.items():
+            if state.motion_gate is not None:
+                state.motion_gate.print_stats(name)
+
+    def get_stats(self):
+        frames = sum(self.batch_sizes)
+        stats = {
+            "frames": frames,
+            "batches": len(self.batch_sizes),
+            "mean_batch_size": frames / len(self.batch_sizes) if self.batch_sizes else 0.0,
+            "throughput_fps": frames / self.elapsed if self.elapsed else 0.0,
+            "cameras": {},
+        }
+        for name, latencies in self.latencies.items():
+            capture = self.capture_stats[name].snapshot()
+            stats["cameras"][name] = {
+                "frames": len(latencies),
+                "dropped": capture["dropped"],
+                "mean_latency_ms": float(np.mean(latencies)) * 1000 if latencies else 0.0,
+                "p95_latency_ms": float(np.percentile(latencies, 95)) * 1000 if latencies else 0.0,
+            }
+        return stats
+
+    def print_stats(self):
+        stats = self.get_stats()
+        print(f"\nMulti-Camera Detection: {stats['frames']} frames in {stats['batches']} batches "
+              f"(mean batch {stats['mean_batch_size']:.2f}), {stats['throughput_fps']:.1f} FPS")
+        for name, camera in stats["cameras"].items():
+            print(f"{name:>12}: frames={camera['frames']} dropped={camera['dropped']} "
+                  f"mean={camera['mean_latency_ms']:.1f}ms p95={camera['p95_latency_ms']:.1f}ms")
@@ -1,101 +1,211 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
-import smtplib
-import ssl
-from email.message import EmailMessage
 import os
+import time
 from datetime import datetime
+from frame_pipeline import FramePipeline, DROP_OLDEST, BLOCK
+from undistortion_map import get_undistortion_map
+from motion_gate import MotionGate
+from detection_roi import RegionsOfInterest
+from person_tracker import IouTracker
+from alert_dispatcher import Alert, create_alert_dispatcher, load_alert_config
+from inference_backends import create_backend
+from instrumentation import metrics
+from frame_sinks import SinkGroup, WindowSink
+from clip_recorder import ClipRecorder, RetentionManager, DEFAULT_RETENTION
+
+class CameraState:
+    def __init__(self, name=None, motion_gate=None, tracker=None):
+        self.name = name
+        self.motion_gate = motion_gate
+        self.tracker = tracker
+        self.last_tracks = []
+        self.frames_since_detection = 0
+        self.alerted_ids = set()
+        self.flash = False
+
 
 class PersonDetector:
-    def __init__(self, camera_matrix, dist_coeffs):
+    def __init__(self, camera_matrix, dist_coeffs, video_source="http://192.168.1.7:8080/video",
+                 queue_size=2, backpressure=DROP_OLDEST, map_cache_dir=None, alert_dispatcher=None,
+                 alert_config_path=None, motion_gate_options=None, roi_polygons=None, detect_interval=1,
+                 tracker_options=None, backend=None, backend_options=None, sinks=None, headless=False,
+                 clip_options=None, retention_options=None, roi_undistort_only=False):
 
         self.camera_matrix = camera_matrix
         self.dist_coeffs = dist_coeffs
-        self.model = YOLO("yolov8s.pt")
-        self.email_sender = "ahmdalicr7@gmail.com"
-        self.email_password = "zosj ifns gxxr dqiw"
-        self.email_receiver = "ahmdalicr7@gmail.com"
+        # Warm-up runs at startup so the first real frames are not slowed down by
+        # lazy allocations inside the runtime.
+        self.backend = backend or create_backend(**(backend_options or {}))
+        self.backend.warmup()
         self.output_folder = "DetectedPerson"
         os.makedirs(self.output_folder, exist_ok=True)
-        self.person_detected = False
-
-    def send_email(self, image_path):
+        if alert_dispatcher is None:
+            alert_dispatcher = create_alert_dispatcher(load_alert_config(alert_config_path), snapshot_dir=self.output_folder)
+        self.alert_dispatcher = alert_dispatcher
+        if sinks is None:
+            sinks = [] if headless else [WindowSink("Person Detection")]
+        self.clip_recorder = None
+        if clip_options is not None:
+            self.clip_recorder = ClipRecorder(os.path.join(self.output_folder, "clips"), **clip_options)
+            sinks = list(sinks) + [self.clip_recorder]
+        self.sinks = SinkGroup(sinks)
+        # Retention deletes files, so it is opt-in and only starts with run().
+        self.retention = None
+        if retention_options is not None:
+            self.retention = RetentionManager(self.output_folder, **dict(DEFAULT_RETENTION, **retention_options))
+        self.motion_gate_options = motion_gate_options
+        self.roi = RegionsOfInterest(roi_polygons) if roi_polygons else None
+        self.roi_undistort_only = roi_undistort_only and self.roi is not None
+        self.detect_interval = detect_interval
+        self.tracker_options = tracker_options or {}
+        self.state = self.create_state()
+        self.video_source = video_source
+        self.queue_size = queue_size
+        self.backpressure = backpressure
+        self.pipeline_stats = None
+        self.map_cache_dir = map_cache_dir
+        self.undistortion_map = None
+
+    def preprocess(self, frame):
+        frame = cv2.resize(frame, (1280, 720))
+        if self.undistortion_map is None:
+            self.undistortion_map = get_undistortion_map(self.camera_matrix, self.dist_coeffs, (1280, 720),
+                                                         cache_dir=self.map_cache_dir)
+        if not self.roi_undistort_only:
+            return self.undistortion_map.apply(frame)
+
+        # Opt-in: only the ROI tile the detector sees is remapped. Outside the ROI the
+        # frame stays distorted, and that is what sinks, clips and snapshots get.
+        x, y, w, h = self.roi.rect
+        frame[y:y+h, x:x+w] = self.undistortion_map.apply(frame, roi=self.roi.rect)
+        return frame
+
+    def create_state(self, name=None):
+        motion_gate = MotionGate(**self.motion_gate_options) if self.motion_gate_options is not None else None
+        return CameraState(name, motion_gate, IouTracker(**self.tracker_options))
+
+    def detect(self, frame):
+        return self.detect_states([frame], [self.state])[0]
+
+    def detect_states(self, frames, states):
+        now = time.monotonic()
+        tracks = [None] * len(frames)
+        infer = []
+
+        for i, (frame, state) in enumerate(zip(frames, states)):
+            if state.tracker.is_stable() and state.frames_since_detection + 1 < self.detect_interval:
+                # Stable tracks are carried forward and the detector runs every detect_interval frames.
+                state.frames_since_detection += 1
+                tracks[i] = state.tracker.predict()
+                metrics.inc("detect_frames_total", result="tracked")
+            elif state.motion_gate is not None and not state.motion_gate.should_infer(frame):
+                # A static scene reuses the camera's last result.
+                tracks[i] = state.last_tracks
+                metrics.inc("detect_frames_total", result="motion_skipped")
+            else:
+                infer.append(i)
+
+        if infer:
+            crops = [self.roi.crop(frames[i]) if self.roi is not None else frames[i] for i in infer]
+            metrics.inc("detect_frames_total", len(infer), result="inferred")
+            with metrics.span("detect_inference"):
+                batch_boxes = self.detect_batch(crops)
+            for i, person_boxes in zip(infer, batch_boxes):
+                if self.roi is not None:
+                    person_boxes = self.roi.filter(person_boxes)
+                states[i].frames_since_detection = 0
+                tracks[i] = states[i].tracker.update(person_boxes, now)
+
+        for state, state_tracks in zip(states, tracks):
+            state.last_tracks = state_tracks
+        return tracks
+
+    def detect_batch(self, frames):
+        # A list input runs the whole batch through one backend call.
+        return self.backend.predict(frames)
+
+    def render(self, frame_undistorted, tracks, state=None):
+        state = state or self.state
+        person_found = bool(tracks)
+        new_tracks = [track for track in tracks if track["id"] not in state.alerted_ids]
+        state.flash = not state.flash if person_found else False
+
+        # Drawing is skipped entirely when no sink wants frames and no alert snapshot is due.
+        if self.sinks.needs_frames or new_tracks:
+            annotated_frame = self.annotate(frame_undistorted, tracks, state.flash, bool(new_tracks))
+
+            if new_tracks:
+                # Encoded in memory; the dispatcher thread saves the snapshot and sends it.
+                ok, jpeg = cv2.imencode(".jpg", annotated_frame)
+                for track in new_tracks:
+                    if ok:
+                        details = {"Track": track["id"], "Dwell time": f"{track['dwell_time']:.1f}s"}
+                        self.alert_dispatcher.submit(Alert(jpeg.tobytes(), camera=state.name, details=details))
+                    state.alerted_ids.add(track["id"])
+                if self.clip_recorder is not None:
+                    self.clip_recorder.trigger(state.name)
+
+            self.sinks.write(annotated_frame, source=state.name)
+
+        # Ids of tracks the tracker has dropped will never come back.
+        state.alerted_ids &= {track.id for track in state.tracker.tracks}
+
+        return self.sinks.poll()
+
+    def annotate(self, frame_undistorted, tracks, flash, alerting):
+        annotated_frame = frame_undistorted.copy()
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        msg = EmailMessage()
-        msg["Subject"] = "Important Mail!! Warning, Person Detected at Home!"
-        msg["From"] = self.email_sender
-        msg["To"] = self.email_receiver
-        msg.set_content(f"Dear Mr. Igbaria Ahmad,\n\nA person has been detected entering your home at {now}.\nPlease find the attached image.\n\nStay safe.")
-
-        with open(image_path, "rb") as f:
-            img_data = f.read()
-            msg.add_attachment(img_data, maintype="image", subtype="jpeg", filename=os.path.basename(image_path))
-
-        context = ssl.create_default_context()
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as server:
-            server.login(self.email_sender, self.email_password)
-            server.send_message(msg)
-            print("Email sent!")
 
-    def run(self):
-        video_source = "http://192.168.1.7:8080/video"
-        cap = cv2.VideoCapture(video_source)
-        flash = False
-
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            frame = cv2.resize(frame, (1280, 720))
-            frame_undistorted = cv2.undistort(frame, self.camera_matrix, self.dist_coeffs)
-            annotated_frame = frame_undistorted.copy()
-
-            results = self.model(frame_undistorted, verbose=False)[0]
-            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            person_found = False
-
-            for box in results.boxes:
-                class_id = int(box.cls[0])
-                class_name = self.model.names[class_id]
-                if class_name.lower() == "person":
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
-                    cv2.putText(annotated_frame, "Person", (x1, y1 - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                    person_found = True
-                    break
-
-            cv2.putText(annotated_frame, now, (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
-
-            if person_found:
-                flash = not flash
-                if flash:
-                    annotated_frame[:10, :] = [0, 0, 255]
-                    annotated_frame[-10:, :] = [0, 0, 255]
-                    annotated_frame[:, :10] = [0, 0, 255]
-                    annotated_frame[:, -10:] = [0, 0, 255]
-
-                cv2.putText(annotated_frame, "WARNING !!!", (900, 50),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 4)
-
-                if not self.person_detected:
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    image_path = os.path.join(self.output_folder, f"person_detected_{timestamp}.jpg")
-                    cv2.putText(annotated_frame, now, (10, 70),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
-                    cv2.imwrite(image_path, annotated_frame)
-                    self.send_email(image_path)
-                    self.person_detected = True
-            else:
-                flash = False
-                self.person_detected = False
+        if self.roi is not None:
+            self.roi.draw(annotated_frame)
+
+        for track in tracks:
+            x1, y1, x2, y2 = track["box"]
+            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
+            cv2.putText(annotated_frame, f"Person #{track['id']} {track['dwell_time']:.0f}s", (x1, y1 - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
 
-            cv2.imshow("Person Detection", annotated_frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+        cv2.putText(annotated_frame, now, (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
 
+        if tracks:
+            if flash:
+                annotated_frame[:10, :] = [0, 0, 255]
+                annotated_frame[-10:, :] = [0, 0, 255]
+                annotated_frame[:, :10] = [0, 0, 255]
+                annotated_frame[:, -10:] = [0, 0, 255]
+
+            cv2.putText(annotated_frame, "WARNING !!!", (900, 50),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 4)
+
+            if alerting:
+                cv2.putText(annotated_frame, now, (10, 70),
+                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+
+        return annotated_frame
+
+    def run(self):
+        cap = cv2.VideoCapture(self.video_source)
+        if not cap.isOpened():
+            print("Error: Could not open video source")
+            return
+
+        # Recorded files are replayed without dropping frames so runs are repeatable.
+        replay = os.path.isfile(str(self.video_source))
+        if self.retention is not None:
+            self.retention.start()
+        self.state = self.create_state()
+        pipeline = FramePipeline(cap, self.preprocess, self.detect, queue_size=self.queue_size,
+                                 backpressure=BLOCK if replay else self.backpressure, drop_frames=not replay)
+        pipeline.run(self.render)
+        self.pipeline_stats = pipeline.get_stats()
+        pipeline.print_stats()
+        if self.state.motion_gate is not None:
+            self.state.motion_gate.print_stats()
+
+        self.alert_dispatcher.close()
+        self.sinks.close()
+        if self.retention is not None:
+            self.retention.close()
         cap.release()
-        cv2.destroyAllWindows()
@@ -0,0 +1,103 @@
+import itertools
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+
+class Track:
+    def __init__(self, track_id, box, now):
+        self.id = track_id
+        self.box = np.asarray(box[:4], dtype=np.float64)
+        self.detected_box = self.box
+        self.velocity = np.zeros(4)
+        self.first_seen = now
+        self.last_seen = now
+        self.hits = 1
+        self.misses = 0
+        self.frames_since_update = 0
+
+    @property
+    def dwell_time(self):
+        return self.last_seen - self.first_seen
+
+    def predict(self):
+        # Predicted frames move the box but do not count as the person being seen.
+        self.box = self.box + self.velocity
+        self.frames_since_update += 1
+
+    def update(self, box, now, smoothing=0.5):
+        # Constant-velocity model smoothed over detections; a cheap stand-in
+        # for a Kalman filter that is enough for people walking through a door.
+        box = np.asarray(box[:4], dtype=np.float64)
+        frames = max(self.frames_since_update, 1)
+        # Displacement is measured from the last detection, not from the predicted box.
+        self.velocity = smoothing * (box - self.detected_box) / frames + (1 - smoothing) * self.velocity
+        self.box = box
+        self.detected_box = box
+        self.last_seen = now
+        self.hits += 1
+        self.misses = 0
+        self.frames_since_update = 0
+
+    def snapshot(self):
+        return {"id": self.id, "box": tuple(int(v) for v in self.box), "dwell_time": self.dwell_time}
+
+
+class IouTracker:
+    def __init__(self, iou_threshold=0.3, min_hits=2, max_misses=5):
+        self.iou_threshold = iou_threshold
+        self.min_hits = min_hits
+        self.max_misses = max_misses
+        self.tracks = []
+        self.ids = itertools.count(1)
+
+    def visible_tracks(self):
+        return [track.snapshot() for track in self.tracks if track.hits >= self.min_hits and track.misses == 0]
+
+    def is_stable(self):
+        return bool(self.tracks) and all(track.hits >= self.min_hits and track.misses == 0 for track in self.tracks)
+
+    def predict(self):
+        for track in self.tracks:
+            track.predict()
+        return self.visible_tracks()
+
+    def update(self, boxes, now):
+        for track in self.tracks:
+            track.predict()
+
+        unmatched_boxes = list(range(len(boxes)))
+        unmatched_tracks = list(range(len(self.tracks)))
+
+        if self.tracks and boxes:
+            ious = iou_matrix([track.box for track in self.tracks], [box[:4] for box in boxes])
+            # Greedy assignment by descending IoU.
+            for flat in np.argsort(-ious, axis=None):
+                t, b = divmod(int(flat), ious.shape[1])
+                if ious[t, b] < self.iou_threshold:
+                    break
+                if t in unmatched_tracks and b in unmatched_boxes:
+                    self.tracks[t].update(boxes[b], now)
+                    unmatched_tracks.remove(t)
+                    unmatched_boxes.remove(b)
+
+        for t in unmatched_tracks:
+            self.tracks[t].misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        for b in unmatched_boxes:
+            self.tracks.append(Track(next(self.ids), boxes[b], now))
+
+        return self.visible_tracks()
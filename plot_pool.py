@@ -0,0 +1,43 @@
+from concurrent.futures import ProcessPoolExecutor
+
+
+def use_agg_backend():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+class PlotRenderPool:
+    def __init__(self, workers=None):
+        self.workers = workers
+        self.executor = None
+        self.futures = []
+
+    def submit(self, fn, *args):
+        # Without workers, plots render inline so small runs avoid pool start-up.
+        if not self.workers:
+            fn(*args)
+            return
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=use_agg_backend)
+        self.futures.append(self.executor.submit(fn, *args))
+
+    def wait(self):
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+        return len(futures)
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
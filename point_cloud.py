@@ -0,0 +1,111 @@
+import numpy as np
+
+# Voxel indices are packed into one int64 key, 21 bits per axis.
+KEY_BITS = 21
+KEY_OFFSET = 1 << (KEY_BITS - 1)
+
+
+def pack_keys(cells):
+    cells = cells.astype(np.int64) + KEY_OFFSET
+    return (cells[:, 0] << (2 * KEY_BITS)) | (cells[:, 1] << KEY_BITS) | cells[:, 2]
+
+
+class VoxelPointCloud:
+    def __init__(self, voxel_size=0.05, merge_every=65536):
+        # Each occupied voxel keeps a running centroid, so memory grows with the
+        # covered volume / voxel_size instead of with the number of frames.
+        self.voxel_size = voxel_size
+        self.merge_every = merge_every
+        self.keys = np.empty(0, dtype=np.int64)
+        self.sums = np.empty((0, 3), dtype=np.float64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.points_added = 0
+        # New voxels are buffered and merged into the sorted arrays in batches. The
+        # buffer may grow to the size of the cloud, so merges stay amortized O(n log n).
+        self.pending = []
+        self.pending_size = 0
+
+    def __len__(self):
+        self.merge()
+        return len(self.keys)
+
+    def cells(self, points):
+        cells = np.floor(points / self.voxel_size).astype(np.int64)
+        valid = np.all(np.abs(cells) < KEY_OFFSET, axis=1)
+        return cells, valid
+
+    def add(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        points = points[np.all(np.isfinite(points), axis=1)]
+        cells, valid = self.cells(points)
+        points, cells = points[valid], cells[valid]
+        if not len(points):
+            return 0
+
+        batch_keys, inverse = np.unique(pack_keys(cells), return_inverse=True)
+        batch_sums = np.zeros((len(batch_keys), 3))
+        np.add.at(batch_sums, inverse.ravel(), points)
+        batch_counts = np.bincount(inverse.ravel(), minlength=len(batch_keys))
+
+        self.pending.append((batch_keys, batch_sums, batch_counts))
+        self.pending_size += len(batch_keys)
+        self.points_added += len(points)
+        if self.pending_size >= max(self.merge_every, len(self.keys)):
+            self.merge()
+        return len(points)
+
+    def merge(self):
+        if not self.pending:
+            return
+        keys = np.concatenate([self.keys] + [keys for keys, _, _ in self.pending])
+        sums = np.concatenate([self.sums] + [sums for _, sums, _ in self.pending])
+        counts = np.concatenate([self.counts] + [counts for _, _, counts in self.pending])
+        self.pending, self.pending_size = [], 0
+
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.ravel()
+        self.sums = np.zeros((len(self.keys), 3))
+        np.add.at(self.sums, inverse, sums)
+        self.counts = np.bincount(inverse, weights=counts, minlength=len(self.keys)).astype(np.int64)
+
+    def points(self, min_count=1):
+        self.merge()
+        mask = self.counts >= min_count
+        return self.sums[mask] / self.counts[mask, None]
+
+    def neighbors(self, point, radius):
+        # Only voxels overlapping the query cube are looked up.
+        self.merge()
+        point = np.asarray(point, dtype=np.float64).reshape(3)
+        reach = int(np.ceil(radius / self.voxel_size))
+        center, _ = self.cells(point[None])
+        offsets = np.stack(np.meshgrid(*[np.arange(-reach, reach + 1)] * 3, indexing="ij"), axis=-1).reshape(-1, 3)
+        candidate_keys = pack_keys(center + offsets)
+
+        if not len(self.keys):
+            return np.empty((0, 3))
+        positions = np.minimum(np.searchsorted(self.keys, candidate_keys), len(self.keys) - 1)
+        positions = positions[self.keys[positions] == candidate_keys]
+        centroids = self.sums[positions] / self.counts[positions, None]
+        return centroids[np.linalg.norm(centroids - point, axis=1) <= radius]
+
+    def write_ply(self, path, min_count=1, chunk_size=65536):
+        self.merge()
+        mask = np.flatnonzero(self.counts >= min_count)
+        header = ("ply\nformat binary_little_endian 1.0\n"
+                  f"element vertex {len(mask)}\n"
+                  "property float x\nproperty float y\nproperty float z\n"
+                  "property uint observations\nend_header\n")
+        vertex = np.dtype([("x", "<f4"), ("y", "<f4"), ("z", "<f4"), ("observations", "<u4")])
+
+        with open(path, "wb") as f:
+            f.write(header.encode("ascii"))
+            # Written in chunks so the export never holds a second full copy of the cloud.
+            for start in range(0, len(mask), chunk_size):
+                rows = mask[start:start + chunk_size]
+                chunk = np.empty(len(rows), dtype=vertex)
+                centroids = self.sums[rows] / self.counts[rows, None]
+                chunk["x"], chunk["y"], chunk["z"] = centroids.T
+                chunk["observations"] = self.counts[rows]
+                f.write(chunk.tobytes())
+        return len(mask)
@@ -0,0 +1,35 @@
+import numpy as np
+from person_tracker import IouTracker, Track
+
+
+def test_velocity_converges_to_true_speed():
+    track = Track(1, (0, 0, 100, 200), now=0.0)
+    for frame in range(1, 30):
+        track.predict()
+        track.update((10 * frame, 0, 100 + 10 * frame, 200), now=float(frame))
+    np.testing.assert_allclose(track.velocity, [10, 0, 10, 0], atol=1e-3)
+
+    for frame in range(30, 35):
+        track.predict()
+    np.testing.assert_allclose(track.box, [340, 0, 440, 200], atol=1e-2)
+
+
+def test_velocity_uses_detection_interval():
+    # Detections every third frame still give the per-frame speed.
+    track = Track(1, (0, 0, 100, 200), now=0.0)
+    for detection in range(1, 20):
+        for _ in range(3):
+            track.predict()
+        frame = 3 * detection
+        track.update((10 * frame, 0, 100 + 10 * frame, 200), now=float(frame))
+    np.testing.assert_allclose(track.velocity, [10, 0, 10, 0], atol=1e-3)
+
+
+def test_dwell_time_stops_when_missed():
+    tracker = IouTracker(min_hits=1, max_misses=5)
+    tracker.update([(0, 0, 100, 200)], now=0.0)
+    tracker.update([(0, 0, 100, 200)], now=2.0)
+    tracker.update([], now=3.0)
+    tracker.update([], now=4.0)
+    tracker.predict()
+    assert tracker.tracks[0].dwell_time == 2.0
@@ -1,95 +1,323 @@
 import cv2
 import numpy as np
 import os
-import glob
-import matplotlib.pyplot as plt
+import json
+from match_store import iter_match_pairs
+from plot_pool import PlotRenderPool
+from instrumentation import metrics
+from point_cloud import VoxelPointCloud
+
+
+def triangulate_dlt(P1, P2, pts1, pts2, chunk_size=None):
+    pts1 = np.asarray(pts1, dtype=np.float64).reshape(-1, 2)
+    pts2 = np.asarray(pts2, dtype=np.float64).reshape(-1, 2)
+    chunk_size = chunk_size or max(len(pts1), 1)
+    points_3d = np.empty((len(pts1), 3), dtype=np.float64)
+
+    for start in range(0, len(pts1), chunk_size):
+        x1, y1 = pts1[start:start + chunk_size].T
+        x2, y2 = pts2[start:start + chunk_size].T
+
+        # One 4x4 DLT system per correspondence, solved by a single batched SVD.
+        A = np.stack((x1[:, None] * P1[2] - P1[0],
+                      y1[:, None] * P1[2] - P1[1],
+                      x2[:, None] * P2[2] - P2[0],
+                      y2[:, None] * P2[2] - P2[1]), axis=1)
+        _, _, vh = np.linalg.svd(A)
+        X = vh[:, -1, :]
+        points_3d[start:start + chunk_size] = X[:, :3] / X[:, 3:]
+
+    return points_3d
+
+
+def plot_3d_points_with_stats(points_3d, delta_values, index, plot_path):
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.axes_grid1.inset_locator import inset_axes
+
+    fig = plt.figure(figsize=(10, 7))
+    ax = fig.add_subplot(111, projection='3d')
+    ax.scatter(points_3d[:, 0], points_3d[:, 1], points_3d[:, 2], s=2)
+    ax.set_title(f"Triangulated 3D Points - Pair {index}")
+    ax.set_xlabel("X")
+    ax.set_ylabel("Y")
+    ax.set_zlabel("Z")
+
+    mean_delta = np.mean(delta_values)
+    max_delta = np.max(delta_values)
+    min_delta = np.min(delta_values)
+    num_points = len(points_3d)
+
+    stats_text = (
+        f"Δ Mean: {mean_delta:.2f}\n"
+        f"Δ Max: {max_delta:.2f}\n"
+        f"Δ Min: {min_delta:.2f}\n"
+        f"Points: {num_points}"
+    )
+    ax.text2D(0.03, 0.95, stats_text, transform=ax.transAxes, fontsize=10, verticalalignment='top',
+              bbox=dict(boxstyle="round,pad=0.3", facecolor="lightyellow", edgecolor="black", alpha=0.9))
+
+    # 🔹 גרף היסטוגרמה קטן בפינה
+    ax_hist = inset_axes(ax, width="30%", height="30%", loc='lower right')
+    ax_hist.hist(delta_values, bins=30, color='skyblue', edgecolor='black')
+    ax_hist.set_title("Δ Histogram", fontsize=8)
+    ax_hist.tick_params(axis='both', labelsize=6)
+
+    plt.savefig(plot_path)
+    plt.close()
+
 
 class Triangulation3D:
-    def __init__(self, camera_matrix, distortion_coeffs, match_points_path, output_path):
+    # Rough bytes per correspondence for the DLT system plus SVD outputs.
+    BYTES_PER_POINT = 512
+
+    def __init__(self, camera_matrix, distortion_coeffs, match_points_path, output_path, memory_budget_mb=64,
+                 render_plots=None, plot_every=1, plot_outliers_only=False, outlier_z=2.0, render_workers=None,
+                 pose_mode="fixed", delta_band=(4, 17), voxel_size=0.05, baseline=0.5, ransac_threshold=1.0,
+                 ransac_prob=0.999, min_inliers=15, max_depth=1000.0):
+        if pose_mode not in ("fixed", "essential"):
+            raise ValueError(f"Unknown pose mode: {pose_mode}")
         self.camera_matrix = camera_matrix
         self.distortion_coeffs = distortion_coeffs
         self.match_points_path = match_points_path
         self.output_path = output_path
+        self.memory_budget_mb = memory_budget_mb
+        # Essential mode keeps memory bounded by the voxel cloud, so it does not hold
+        # per-pair points for plots unless asked to.
+        self.render_plots = (pose_mode == "fixed") if render_plots is None else render_plots
+        self.plot_every = plot_every
+        self.plot_outliers_only = plot_outliers_only
+        self.outlier_z = outlier_z
+        self.render_workers = render_workers
+        self.pose_mode = pose_mode
+        self.delta_band = delta_band
+        self.voxel_size = voxel_size
+        self.baseline = baseline
+        self.ransac_threshold = ransac_threshold
+        self.ransac_prob = ransac_prob
+        self.min_inliers = min_inliers
+        self.max_depth = max_depth
 
         self.points3d_plot_path = os.path.join(self.output_path, "3DPOINTS")
         os.makedirs(self.points3d_plot_path, exist_ok=True)
 
-    def triangulate_points(self):
-        files1 = sorted(glob.glob(os.path.join(self.match_points_path, "matched_points1_*.npy")))
-        files2 = sorted(glob.glob(os.path.join(self.match_points_path, "matched_points2_*.npy")))
+        self.P1, self.P2 = self.projection_matrices()
 
-        if len(files1) != len(files2):
-            print("Num Points dont match")
-            return
+    def projection_matrices(self):
+        rvec1 = np.array([[0], [0], [0]], dtype=np.float32)
+        tvec1 = np.array([[0], [0], [0]], dtype=np.float32)
+        rvec2 = np.array([[0], [0], [0]], dtype=np.float32)
+        tvec2 = np.array([[0.5], [0], [0]], dtype=np.float32)
+
+        R1, _ = cv2.Rodrigues(rvec1)
+        R2, _ = cv2.Rodrigues(rvec2)
+        P1 = self.camera_matrix @ np.hstack((R1, tvec1))
+        P2 = self.camera_matrix @ np.hstack((R2, tvec2))
+        return P1, P2
+
+    def filter_pair(self, pts1, pts2):
+        delta = np.linalg.norm(pts1 - pts2, axis=1)
+        if self.delta_band is None:
+            return pts1, pts2, delta
+        low, high = self.delta_band
+        mask = (delta >= low) & (delta <= high)
+        return pts1[mask], pts2[mask], delta[mask]
 
-        for i, (f1, f2) in enumerate(zip(files1, files2), 1):
-            pts1 = np.load(f1)
-            pts2 = np.load(f2)
+    def triangulate_chunks(self, pairs):
+        # Pairs are buffered only until they fill one chunk of memory_budget_mb, so
+        # memory stays flat however many pairs the archive holds.
+        chunk_size = max(1, int(self.memory_budget_mb * 1024 * 1024 // self.BYTES_PER_POINT)) if self.memory_budget_mb else None
+        pair_ids, filtered1, filtered2, deltas = [], [], [], []
+        buffered = 0
 
-            delta = np.linalg.norm(pts1 - pts2, axis=1)
-            mask = (delta >= 4) & (delta <= 17)
-            filtered_pts1 = pts1[mask]
-            filtered_pts2 = pts2[mask]
-            delta_filtered = delta[mask]
+        for index, pts1, pts2 in pairs:
+            filtered_pts1, filtered_pts2, delta_filtered = self.filter_pair(pts1, pts2)
 
-          
             if len(filtered_pts1) < 5:
                 continue
 
-            rvec1 = np.array([[0], [0], [0]], dtype=np.float32)
-            tvec1 = np.array([[0], [0], [0]], dtype=np.float32)
-            rvec2 = np.array([[0], [0], [0]], dtype=np.float32)
-            tvec2 = np.array([[0.5], [0], [0]], dtype=np.float32)
+            pair_ids.append(np.full(len(filtered_pts1), index, dtype=np.int64))
+            filtered1.append(filtered_pts1)
+            filtered2.append(filtered_pts2)
+            deltas.append(delta_filtered)
+            buffered += len(filtered_pts1)
+
+            if chunk_size is not None and buffered >= chunk_size:
+                yield self.triangulate_chunk(pair_ids, filtered1, filtered2, deltas, chunk_size)
+                pair_ids, filtered1, filtered2, deltas = [], [], [], []
+                buffered = 0
+
+        if pair_ids:
+            yield self.triangulate_chunk(pair_ids, filtered1, filtered2, deltas, chunk_size)
+
+    def triangulate_chunk(self, pair_ids, filtered1, filtered2, deltas, chunk_size):
+        with metrics.span("triangulate"):
+            points_3d = triangulate_dlt(self.P1, self.P2, np.concatenate(filtered1), np.concatenate(filtered2), chunk_size)
+        metrics.inc("triangulated_pairs_total", len(pair_ids))
+        metrics.inc("triangulated_points_total", len(points_3d))
+        pair_ids, deltas = np.concatenate(pair_ids), np.concatenate(deltas)
+
+        starts = np.flatnonzero(np.r_[True, pair_ids[1:] != pair_ids[:-1]])
+        return list(zip(pair_ids[starts].tolist(), np.split(points_3d, starts[1:]), np.split(deltas, starts[1:])))
+
+    def triangulate_points(self):
+        if self.pose_mode == "essential":
+            pairs, stats = self.triangulate_sequence(iter_match_pairs(self.match_points_path))
+            self.finish(pairs, stats)
+            return
+
+        pairs, stats = [], {}
+        for chunk in self.triangulate_chunks(iter_match_pairs(self.match_points_path)):
+            for index, pair_points, pair_deltas in chunk:
+                if self.render_plots and len(stats) % max(1, self.plot_every) == 0:
+                    # Only pairs that can be selected for plotting are kept in memory.
+                    pairs.append((index, pair_points, pair_deltas))
+                stats[index] = self.save_3d_points_with_stats(pair_points, pair_deltas, index)
+        self.finish(pairs, stats)
+
+    def estimate_pose(self, pts1, pts2):
+        E, mask = cv2.findEssentialMat(pts1, pts2, self.camera_matrix, cv2.RANSAC, self.ransac_prob,
+                                       self.ransac_threshold)
+        if E is None or E.shape[0] < 3 or mask is None or int(mask.sum()) < self.min_inliers:
+            return None
+        # Several solutions come back stacked (3k x 3); the first one is used.
+        E = E[:3]
+        # Depths are in units of the (unit) translation, so small frame-to-frame motion
+        # puts most points far beyond the default 50-unit cheirality cutoff.
+        inliers, R, t, pose_mask, _ = cv2.recoverPose(E, pts1, pts2, self.camera_matrix,
+                                                      distanceThresh=self.max_depth, mask=mask.copy())
+        if inliers < self.min_inliers:
+            return None
+        return R, t.reshape(3), pose_mask.ravel() > 0
+
+    def triangulate_sequence(self, pairs):
+        # Poses are chained frame to frame (world -> camera). Monocular translation
+        # has no scale, so every step is scaled to `baseline`. A pair without a pose
+        # ends the chain; the next pose starts a new segment with its own cloud,
+        # since its frame cannot be registered to the previous one.
+        R_world, t_world = np.eye(3), np.zeros(3)
+        self.clouds = []
+        self.poses = {}
+        self.breaks = []
+        plotted, stats = [], {}
+        last_index = None
+
+        for index, pts1, pts2 in pairs:
+            if last_index is not None and index != last_index + 1:
+                self.break_chain(last_index + 1, "missing_pair", warn=True)
+                last_index = None
+
+            pts1, pts2, deltas = self.filter_pair(np.asarray(pts1, dtype=np.float64), np.asarray(pts2, dtype=np.float64))
+            if len(pts1) < max(self.min_inliers, 5):
+                self.break_chain(index, "too_few_points", warn=last_index is not None)
+                last_index = None
+                continue
+
+            undistorted1 = cv2.undistortPoints(pts1.reshape(-1, 1, 2), self.camera_matrix, self.distortion_coeffs,
+                                               P=self.camera_matrix).reshape(-1, 2)
+            undistorted2 = cv2.undistortPoints(pts2.reshape(-1, 1, 2), self.camera_matrix, self.distortion_coeffs,
+                                               P=self.camera_matrix).reshape(-1, 2)
+            with metrics.span("pose_estimation"):
+                pose = self.estimate_pose(undistorted1, undistorted2)
+            if pose is None:
+                metrics.inc("pose_failures_total")
+                self.break_chain(index, "pose_failed", warn=last_index is not None)
+                last_index = None
+                continue
+
+            if last_index is None:
+                R_world, t_world = np.eye(3), np.zeros(3)
+                self.clouds.append(VoxelPointCloud(self.voxel_size))
+            last_index = index
+            segment = len(self.clouds) - 1
+
+            R, t, inliers = pose
+            R_next = R @ R_world
+            t_next = R @ t_world + t * self.baseline
+            P1 = self.camera_matrix @ np.hstack((R_world, t_world[:, None]))
+            P2 = self.camera_matrix @ np.hstack((R_next, t_next[:, None]))
+            with metrics.span("triangulate"):
+                points_3d = triangulate_dlt(P1, P2, undistorted1[inliers], undistorted2[inliers])
+
+            # Keep points in front of both cameras.
+            depth1 = points_3d @ R_world[2] + t_world[2]
+            depth2 = points_3d @ R_next[2] + t_next[2]
+            valid = (depth1 > 0) & (depth2 > 0)
+            points_3d, pair_deltas = points_3d[valid], deltas[inliers][valid]
+            R_world, t_world = R_next, t_next
+            self.poses[index] = {"R": R_world.tolist(), "t": t_world.tolist(), "segment": segment}
+            if not len(points_3d):
+                continue
+
+            self.clouds[segment].add(points_3d)
+            metrics.inc("triangulated_pairs_total")
+            metrics.inc("triangulated_points_total", len(points_3d))
+            stats[index] = self.pair_stats(points_3d, pair_deltas, depth1[valid])
+            stats[index]["inliers"] = int(inliers.sum())
+            stats[index]["segment"] = segment
+            if self.render_plots and (len(stats) - 1) % max(1, self.plot_every) == 0:
+                # Per-pair points are only kept for pairs that can be selected for plotting.
+                plotted.append((index, points_3d, pair_deltas))
 
-            R1, _ = cv2.Rodrigues(rvec1)
-            R2, _ = cv2.Rodrigues(rvec2)
-            P1 = self.camera_matrix @ np.hstack((R1, tvec1))
-            P2 = self.camera_matrix @ np.hstack((R2, tvec2))
+        clouds = []
+        for segment, cloud in enumerate(self.clouds):
+            name = "global_cloud.ply" if segment == 0 else f"global_cloud_{segment}.ply"
+            vertices = cloud.write_ply(os.path.join(self.points3d_plot_path, name))
+            clouds.append({"segment": segment, "file": name, "voxels": vertices, "points": cloud.points_added})
+            print(f"Global cloud: {vertices} voxels from {cloud.points_added} points → {name}")
+        with open(os.path.join(self.points3d_plot_path, "poses.json"), "w", encoding="utf-8") as f:
+            json.dump({"poses": {str(index): pose for index, pose in self.poses.items()},
+                       "breaks": self.breaks, "clouds": clouds}, f, indent=2)
+        print(f"{len(self.poses)} poses in {len(self.clouds)} segments, {len(self.breaks)} breaks")
+        return plotted, stats
 
-            filtered_pts1 = filtered_pts1.T
-            filtered_pts2 = filtered_pts2.T
+    def break_chain(self, index, reason, warn):
+        # Every pair without a pose is recorded; only the one ending a segment is printed.
+        self.breaks.append({"index": index, "reason": reason})
+        if warn:
+            print(f"Warning: pose chain broken at pair {index} ({reason}), the next pose starts a new segment")
 
-            points_4d = cv2.triangulatePoints(P1, P2, filtered_pts1, filtered_pts2)
-            points_3d = points_4d[:3] / points_4d[3]
+    def finish(self, pairs, stats):
+        with open(os.path.join(self.points3d_plot_path, "points3d_stats.json"), "w", encoding="utf-8") as f:
+            json.dump({str(index): pair_stats for index, pair_stats in stats.items()}, f, indent=2)
 
-            self.save_3d_points_with_stats(points_3d.T, delta_filtered, i)
+        if self.render_plots:
+            selected = self.select_pairs_to_plot(stats)
+            with metrics.span("triangulation_render"), PlotRenderPool(self.render_workers) as pool:
+                for index, pair_points, pair_deltas in pairs:
+                    if index in selected:
+                        plot_path = os.path.join(self.points3d_plot_path, f"points3d_{index}.png")
+                        pool.submit(plot_3d_points_with_stats, pair_points, pair_deltas, index, plot_path)
+            print(f"Rendered {len(selected)} of {len(stats)} 3D plots")
 
         print("Triangulation3D Done!")
 
     def save_3d_points_with_stats(self, points_3d, delta_values, index):
         npy_path = os.path.join(self.points3d_plot_path, f"points3d_{index}.npy")
         np.save(npy_path, points_3d)
+        return self.pair_stats(points_3d, delta_values, points_3d[:, 2])
+
+    def pair_stats(self, points_3d, delta_values, depths):
+        return {
+            "mean_delta": float(np.mean(delta_values)),
+            "max_delta": float(np.max(delta_values)),
+            "min_delta": float(np.min(delta_values)),
+            "median_depth": float(np.median(depths)),
+            "points": len(points_3d),
+        }
+
+    def select_pairs_to_plot(self, stats):
+        indices = list(stats)
+        selected = set(indices[::max(1, self.plot_every)])
 
-        fig = plt.figure(figsize=(10, 7))
-        ax = fig.add_subplot(111, projection='3d')
-        ax.scatter(points_3d[:, 0], points_3d[:, 1], points_3d[:, 2], s=2)
-        ax.set_title(f"Triangulated 3D Points - Pair {index}")
-        ax.set_xlabel("X")
-        ax.set_ylabel("Y")
-        ax.set_zlabel("Z")
-
-        mean_delta = np.mean(delta_values)
-        max_delta = np.max(delta_values)
-        min_delta = np.min(delta_values)
-        num_points = len(points_3d)
-
-        stats_text = (
-            f"Δ Mean: {mean_delta:.2f}\n"
-            f"Δ Max: {max_delta:.2f}\n"
-            f"Δ Min: {min_delta:.2f}\n"
-            f"Points: {num_points}"
-        )
-        ax.text2D(0.03, 0.95, stats_text, transform=ax.transAxes, fontsize=10, verticalalignment='top',
-                  bbox=dict(boxstyle="round,pad=0.3", facecolor="lightyellow", edgecolor="black", alpha=0.9))
-
-        # 🔹 גרף היסטוגרמה קטן בפינה
-        from mpl_toolkits.axes_grid1.inset_locator import inset_axes
-        ax_hist = inset_axes(ax, width="30%", height="30%", loc='lower right')
-        ax_hist.hist(delta_values, bins=30, color='skyblue', edgecolor='black')
-        ax_hist.set_title("Δ Histogram", fontsize=8)
-        ax_hist.tick_params(axis='both', labelsize=6)
-
-        plot_path = os.path.join(self.points3d_plot_path, f"points3d_{index}.png")
-        plt.savefig(plot_path)
-        plt.close()
+        if self.plot_outliers_only and indices:
+            # A pair is an outlier when its mean delta or median depth sits far from the session average.
+            outliers = set()
+            for key in ("mean_delta", "median_depth"):
+                values = np.array([stats[index][key] for index in indices])
+                std = values.std()
+                if std > 0:
+                    z = np.abs(values - values.mean()) / std
+                    outliers.update(index for index, score in zip(indices, z) if score > self.outlier_z)
+            selected &= outliers
 
+        return selected
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import threading
+import cv2
+import numpy as np
+
+
+class UndistortionMap:
+    def __init__(self, camera_matrix, dist_coeffs, resolution, alpha=None):
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+        self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64)
+        self.resolution = tuple(int(v) for v in resolution)
+        self.alpha = alpha
+
+        # alpha=None keeps the original camera matrix, which is what
+        # cv2.undistort does when no new camera matrix is passed.
+        if alpha is None:
+            self.new_camera_matrix = self.camera_matrix
+            self.roi = (0, 0, self.resolution[0], self.resolution[1])
+        else:
+            self.new_camera_matrix, self.roi = cv2.getOptimalNewCameraMatrix(
+                self.camera_matrix, self.dist_coeffs, self.resolution, alpha, self.resolution)
+
+        self.map1, self.map2 = cv2.initUndistortRectifyMap(
+            self.camera_matrix, self.dist_coeffs, None, self.new_camera_matrix, self.resolution, cv2.CV_16SC2)
+
+    def apply(self, img, roi=None, crop=False):
+        if roi is not None:
+            x, y, w, h = roi
+            return cv2.remap(img, self.map1[y:y+h, x:x+w], self.map2[y:y+h, x:x+w], cv2.INTER_LINEAR)
+
+        undistorted = cv2.remap(img, self.map1, self.map2, cv2.INTER_LINEAR)
+        if crop:
+            x, y, w, h = self.roi
+            undistorted = undistorted[y:y+h, x:x+w]
+        return undistorted
+
+    def save(self, path):
+        np.savez(path, camera_matrix=self.camera_matrix, dist_coeffs=self.dist_coeffs,
+                 resolution=np.array(self.resolution), alpha=np.array(-1.0 if self.alpha is None else self.alpha),
+                 new_camera_matrix=self.new_camera_matrix, roi=np.array(self.roi),
+                 map1=self.map1, map2=self.map2)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        undistortion_map = cls.__new__(cls)
+        undistortion_map.camera_matrix = data["camera_matrix"]
+        undistortion_map.dist_coeffs = data["dist_coeffs"]
+        undistortion_map.resolution = tuple(int(v) for v in data["resolution"])
+        alpha = float(data["alpha"])
+        undistortion_map.alpha = None if alpha < 0 else alpha
+        undistortion_map.new_camera_matrix = data["new_camera_matrix"]
+        undistortion_map.roi = tuple(int(v) for v in data["roi"])
+        undistortion_map.map1 = data["map1"]
+        undistortion_map.map2 = data["map2"]
+        return undistortion_map
+
+
+_maps = {}
+_maps_lock = threading.Lock()
+
+
+def get_undistortion_map(camera_matrix, dist_coeffs, resolution, alpha=None, cache_dir=None):
+    camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+    dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64)
+    resolution = tuple(int(v) for v in resolution)
+    key = (camera_matrix.tobytes(), dist_coeffs.tobytes(), resolution, alpha)
+
+    with _maps_lock:
+        undistortion_map = _maps.get(key)
+        if undistortion_map is not None:
+            return undistortion_map
+
+        cache_file = None
+        if cache_dir is not None:
+            digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+            cache_file = os.path.join(cache_dir, f"undistort_map_{resolution[0]}x{resolution[1]}_{digest}.npz")
+
+        if cache_file is not None and os.path.exists(cache_file):
+            undistortion_map = UndistortionMap.load(cache_file)
+        else:
+            undistortion_map = UndistortionMap(camera_matrix, dist_coeffs, resolution, alpha)
+            if cache_file is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                undistortion_map.save(cache_file)
+
+        _maps[key] = undistortion_map
+        return undistortion_map